@@ -1,12 +1,73 @@
 # app.py
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, g, request, jsonify, render_template, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+import gzip
+import hashlib
 import joblib
-import pandas as pd
+import json
 import numpy as np
 import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from scripts.explanations import ExplanationService, TimeSeriesExplainer, latest_time_series_artifact
+from scripts.metrics import MetricsRegistry, SamplingProfiler
+from scripts.safety_model import (
+    BUNDLE_MANIFEST, BUNDLE_PREFIX, STAT_COLUMNS, CityFeatureTable, ScoreGrid, clamp_scores, find_latest_bundle,
+    load_bundle, ranked_order, round_scores, shared_dir, top_k as select_top_k
+)
+
+def json_bytes(obj, indent=False):
+    """JSON with sorted keys, as jsonify writes it; serialized by orjson when installed.
+
+    Compact by default; indent=True gives the 2-space layout jsonify uses in debug mode.
+    orjson output parses to the same values as the stdlib encoder's but is not
+    byte-identical: non-ASCII text is written as UTF-8 rather than \\u escapes,
+    and small floats are formatted differently (0.00001 and 1e-7 where the
+    stdlib writes 1e-05 and 1e-07).
+    """
+    if orjson is not None:
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=DefaultJSONProvider.default, option=option)
+    if indent:
+        return json.dumps(obj, default=DefaultJSONProvider.default, sort_keys=True, indent=2).encode()
+    return json.dumps(obj, default=DefaultJSONProvider.default, sort_keys=True, separators=(',', ':')).encode()
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify/get_json through orjson when it is installed: same sorted keys and values, less CPU.
+
+    Flask asks for compact separators normally and indent=2 in debug mode (python app.py);
+    both go through orjson (see json_bytes for how its bytes differ from the stdlib
+    encoder's). Any other dumps options use the stdlib encoder.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs.keys() - {'separators', 'indent'} or kwargs.get('indent') not in (None, 2):
+            return super().dumps(obj, **kwargs)
+        return json_bytes(obj, indent='indent' in kwargs).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)  # Enable CORS for all routes
 
 # Base folder containing this app.py
@@ -14,170 +75,952 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 print("Current working directory:", os.getcwd())
 print("Files in folder:", os.listdir(BASE_DIR))
 
+# Native bundles written by train.py, preferred over the pickles below
+MODELS_DIR = os.path.join(BASE_DIR, 'models')
+
 # Model files to try loading
 model_files = [
     os.path.join(BASE_DIR, 'crime_safety_model_deployment.pkl'),
     os.path.join(BASE_DIR, 'city_safety_predictor_model.pkl')
 ]
 
-# Load model with debug prints
-model = None
-label_encoders = {}
-feature_columns = []
-all_cities = []
-city_stats = {}
+# Directory for memory-mapped arrays shared by every worker process (e.g. under
+# gunicorn). Unset keeps everything in per-process memory.
+SHARED_ARTIFACTS_DIR = os.environ.get('SHARED_ARTIFACTS_DIR')
+
+# Seconds between background scans of models/ for new versions (0 = scan only
+# when requests arrive, at most once a second)
+MODEL_WATCH_INTERVAL = float(os.environ.get('MODEL_WATCH_INTERVAL', 5))
+MODEL_HISTORY_SIZE = 10
+
+# JSON responses at least this large are gzip/br compressed when the client accepts it
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+COMPRESS_LEVEL = 6
+
+# Safest / most dangerous cities returned by /predict unless the request sets top_k
+DEFAULT_TOP_K = 5
+
+# /predict/batch: profile x city rows scored per predict call, and profiles per request
+BATCH_CHUNK_ROWS = int(os.environ.get('BATCH_CHUNK_ROWS', 100000))
+MAX_BATCH_PROFILES = int(os.environ.get('MAX_BATCH_PROFILES', 100000))
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+# Prometheus metrics, served on /metrics
+metrics = MetricsRegistry()
+REQUESTS = metrics.counter('crimesafe_requests_total', 'HTTP requests by endpoint, method and status code',
+                           ('endpoint', 'method', 'status'))
+REQUEST_SECONDS = metrics.histogram('crimesafe_request_duration_seconds',
+                                    'Time from request start to response (first byte for streams)', ('endpoint',))
+STAGE_SECONDS = metrics.histogram('crimesafe_stage_duration_seconds',
+                                  'Time spent per request handling stage: validate, cache, features, predict, '
+                                  'rank, serialize, compress, explain', ('stage',))
+ERRORS = metrics.counter('crimesafe_errors_total', 'Errors logged while loading models or scoring, by stage',
+                         ('stage',))
+MODEL_LOADS = metrics.counter('crimesafe_model_loads_total', 'Model artifact load attempts by outcome', ('outcome',))
+MODEL_LOAD_SECONDS = metrics.histogram('crimesafe_model_load_duration_seconds',
+                                       'Artifact load plus warm-up time of each successful model load',
+                                       buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+
+# Sampling profiler over request threads, off unless PROFILER_INTERVAL_MS is set;
+# collapsed stacks are served on /debug/profile
+PROFILER_INTERVAL_MS = float(os.environ.get('PROFILER_INTERVAL_MS', 0))
+profiler = SamplingProfiler(PROFILER_INTERVAL_MS / 1000).start() if PROFILER_INTERVAL_MS > 0 else None
+
+def load_artifacts(file):
+    """Load a bundle directory (via its manifest) or a pickled model file"""
+    if os.path.basename(file) == BUNDLE_MANIFEST:
+        return load_bundle(os.path.dirname(file))
+    return joblib.load(file)
+
+def artifact_size(file):
+    """Bytes on disk: the pickle, or every file of a bundle directory"""
+    if os.path.basename(file) == BUNDLE_MANIFEST:
+        return sum(entry.stat().st_size for entry in os.scandir(os.path.dirname(file)) if entry.is_file())
+    return os.path.getsize(file)
 
-for file in model_files:
-    print(f"\nTrying to load model from: {file}")
-    if os.path.exists(file):
+def artifact_fingerprint(path):
+    """Identify a model artifact by path, size and modification time"""
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (path, stat.st_size, stat.st_mtime_ns)
+
+def explanation_background(table):
+    """Small background sample for linear explanations: every city over a spread of training profiles"""
+    rows = [
+        table.fill(age, gender, year)
+        for age in (10, 25, 40, 55, 70) for gender in ('M', 'F') for year in (2020, 2021, 2022, 2023)
+    ]
+    rows = [features for features in rows if features is not None]
+    return np.vstack(rows) if rows else None
+
+
+class LoadedModel:
+    """One model artifact and everything compiled from it; swapped in and out as a whole"""
+
+    def __init__(self, path, loaded, table, explainer, version, load_seconds):
+        self.path = path
+        self.fingerprint = artifact_fingerprint(path)
+        self.model = loaded['model']
+        self.label_encoders = loaded.get('label_encoders', {})
+        self.feature_columns = loaded.get('feature_columns', [])
+        self.all_cities = loaded.get('all_cities', [])
+        self.city_stats = loaded.get('city_stats', {})
+        self.feature_table = table
+        self.explainer = explainer
+        self.version = version
+        self.load_seconds = load_seconds
+        self.warmup_seconds = None
+        self.artifact_bytes = artifact_size(path)
+        self.loaded_at = time.time()
+
+    @classmethod
+    def load(cls, file):
+        """Load one artifact file and compile its feature table; None if it holds no model"""
+        start = time.perf_counter()
+        artifacts = load_artifacts(file)
+        print(f"✅ Loaded object type: {type(artifacts)}")
+
+        loaded = {'model': artifacts}  # if it's just a model object
+        if isinstance(artifacts, dict):
+            print(f"Keys in artifacts: {list(artifacts.keys())}")
+            loaded = artifacts
+        if loaded.get('model', None) is None:
+            print(f"❌ No model found inside {file}")
+            return None
+
+        # Static per-city feature table, compiled once per model load
+        table = CityFeatureTable(
+            loaded.get('label_encoders', {}),
+            loaded.get('feature_columns', []),
+            loaded.get('all_cities', []),
+            loaded.get('city_stats', {}),
+            stat_columns=loaded.get('stat_columns', STAT_COLUMNS),
+        )
+        for city in table.skipped_cities:
+            print(f"Error predicting for city {city}: unseen label")
+        fingerprint = artifact_fingerprint(file)
+        if SHARED_ARTIFACTS_DIR:
+            table.share(shared_dir(SHARED_ARTIFACTS_DIR, fingerprint))
+
+        version = loaded.get('model_version') or f"{os.path.basename(file)}@{fingerprint[2]}"
+        # Explanations are computed on demand and cached per model version
         try:
-            artifacts = joblib.load(file)
-            print(f"✅ Loaded object type: {type(artifacts)}")
-
-            if isinstance(artifacts, dict):
-                print(f"Keys in artifacts: {list(artifacts.keys())}")
-                model = artifacts.get('model', None)
-                label_encoders = artifacts.get('label_encoders', {})
-                feature_columns = artifacts.get('feature_columns', [])
-                all_cities = artifacts.get('all_cities', [])
-                city_stats = artifacts.get('city_stats', {})
-            else:
-                model = artifacts  # if it's just a model object
+            explainer = ExplanationService(loaded['model'], table.feature_columns, version,
+                                           background=explanation_background(table))
+        except TypeError as e:
+            print(f"Explanations unavailable: {e}")
+            explainer = None
 
-            if model is not None:
-                print(f"✅ Model loaded successfully from {file}")
-                print(f"Model object: {model}")
-                break
-            else:
-                print(f"❌ No model found inside {file}")
+        return cls(file, loaded, table, explainer, version, time.perf_counter() - start)
+
+    def warm_up(self):
+        """Score every city once so the first request doesn't pay for lazy initialisation"""
+        start = time.perf_counter()
+        if len(self.feature_table):
+            features = self.feature_table.fill(30, 'F', 2024)
+            if features is not None:
+                self.model.predict(features)
+        self.warmup_seconds = time.perf_counter() - start
+
+    def describe(self):
+        return {
+            "version": self.version,
+            "path": os.path.relpath(self.path, BASE_DIR),
+            "model_type": type(self.model).__name__,
+            "cities": len(self.feature_table),
+            "loaded_at": datetime.fromtimestamp(self.loaded_at).isoformat(timespec='seconds'),
+            "load_seconds": round(self.load_seconds, 4),
+            "warmup_seconds": round(self.warmup_seconds, 4) if self.warmup_seconds is not None else None,
+            "artifact_bytes": self.artifact_bytes,
+        }
+
+
+class ModelRegistry:
+    """Active model plus hot-reload of new versions from models/ without a restart.
+
+    Candidates are the latest bundle in models/, then the pickles in model_files.
+    When the models/ listing (bundles, metadata JSON) or the active file changes,
+    the first usable candidate is loaded and warmed up in a background thread and
+    then replaces `active` in a single assignment, so each request sees either the
+    old or the new model, never a mix.
+    """
+
+    def __init__(self, models_dir, files):
+        self.models_dir = models_dir
+        self.files = files
+        self.active = None
+        self.history = []
+        self.listeners = []
+        self.state = None
+        self.loading = False
+        self.last_check = 0.0
+        self.last_error = None
+        self.lock = threading.Lock()
+
+    def candidates(self):
+        candidates = list(self.files)
+        bundle_dir = find_latest_bundle(self.models_dir)
+        if bundle_dir is not None:
+            candidates.insert(0, os.path.join(bundle_dir, BUNDLE_MANIFEST))
+        return candidates
+
+    def scan(self):
+        """Cheap signature of everything that could change which model should be active"""
+        try:
+            entries = sorted(
+                (entry.name, entry.stat().st_mtime_ns)
+                for entry in os.scandir(self.models_dir)
+                if entry.name.startswith((BUNDLE_PREFIX, 'metadata_')) and not entry.name.endswith('.tmp')
+            )
+        except OSError:
+            entries = []
+        active_path = self.active.path if self.active is not None else None
+        return tuple(entries), tuple(artifact_fingerprint(file) for file in self.files), artifact_fingerprint(active_path)
+
+    def load(self):
+        """Load the first usable candidate; returns a warmed-up LoadedModel or None.
+
+        Older candidates are only tried on a cold start: once a model is active, a
+        newest candidate that fails to load leaves it in place.
+        """
+        for file in self.candidates():
+            print(f"\nTrying to load model from: {file}")
+            if not os.path.exists(file):
+                print(f"❌ File does not exist: {file}")
+                continue
+            if self.active is not None and artifact_fingerprint(file) == self.active.fingerprint:
+                return None  # the active model is still the best candidate
+            try:
+                loaded = LoadedModel.load(file)
+                if loaded is None:
+                    raise ValueError("no model in artifact")
+            except Exception as e:
+                print(f"❌ Failed to load model from '{file}': {e}")
+                self.last_error = f"{file}: {e}"
+                MODEL_LOADS.inc(outcome='failure')
+                if self.active is not None:
+                    print(f"Keeping model {self.active.version}")
+                    return None
+                continue
+            loaded.warm_up()
+            MODEL_LOADS.inc(outcome='success')
+            MODEL_LOAD_SECONDS.observe(loaded.load_seconds + loaded.warmup_seconds)
+            print(f"✅ Model loaded successfully from {file}")
+            print(f"Model object: {loaded.model}")
+            return loaded
+        return None
+
+    def activate(self, loaded):
+        previous = self.active
+        self.active = loaded
+        self.history = ([loaded.describe()] + self.history)[:MODEL_HISTORY_SIZE]
+        if previous is not None:
+            print(f"✅ Swapped model {previous.version} -> {loaded.version}")
+        for listener in self.listeners:
+            listener(loaded)
+
+    def start(self):
+        """Initial synchronous load, then the background watcher"""
+        self.state = self.scan()
+        loaded = self.load()
+        if loaded is not None:
+            self.activate(loaded)
+        if MODEL_WATCH_INTERVAL > 0:
+            threading.Thread(target=self._watch, daemon=True).start()
+        return loaded is not None
+
+    def _watch(self):
+        while True:
+            time.sleep(MODEL_WATCH_INTERVAL)
+            self.check(force=True)
+
+    def check(self, force=False):
+        """Start a background reload if anything relevant changed on disk"""
+        now = time.monotonic()
+        if not force and now - self.last_check < 1.0:
+            return
+        self.last_check = now
+        state = self.scan()
+        with self.lock:
+            if state == self.state or self.loading:
+                return
+            self.state = state
+            self.loading = True
+        print("Model artifacts changed, reloading in the background")
+        threading.Thread(target=self._reload, daemon=True).start()
+
+    def _reload(self):
+        try:
+            loaded = self.load()
+            if loaded is not None:
+                self.activate(loaded)
         except Exception as e:
-            print(f"❌ Failed to load model from '{file}': {e}")
-    else:
-        print(f"❌ File does not exist: {file}")
+            print(f"❌ Model reload failed: {e}")
+            ERRORS.inc(stage='reload')
+            self.last_error = str(e)
+        finally:
+            with self.lock:
+                self.loading = False
+        # self.state is the listing from before the load; anything written while it
+        # ran (or the swap itself) differs from it and gets its own reload
+        self.check(force=True)
+
+    def describe(self):
+        return {
+            "active": self.active.describe() if self.active is not None else None,
+            "history": self.history,
+            "available": [os.path.relpath(file, BASE_DIR) for file in self.candidates() if os.path.exists(file)],
+            "reloading": self.loading,
+            "watch_interval_seconds": MODEL_WATCH_INTERVAL,
+            "last_error": self.last_error,
+        }
 
-if model is None:
+
+registry = ModelRegistry(MODELS_DIR, model_files)
+if not registry.start():
     print("❌ No valid model loaded. Check your .pkl files.")
 
-# Prediction function
-def predict_city_safety(age, gender, year):
-    """Prediction function for the API"""
-    if model is None:
-        raise Exception("Model not loaded")
+def active_model_value(attribute):
+    """Gauge callback reading one LoadedModel attribute of the active model"""
+    def values():
+        current = registry.active
+        value = getattr(current, attribute, None)
+        return {} if value is None else {(): value}
+    return values
+
+metrics.gauge('crimesafe_model_info', 'Active model version and type (always 1)', ('version', 'model_type'),
+              function=lambda: {} if registry.active is None else {
+                  (registry.active.version, type(registry.active.model).__name__): 1})
+metrics.gauge('crimesafe_model_load_seconds', 'Artifact load time of the active model',
+              function=active_model_value('load_seconds'))
+metrics.gauge('crimesafe_model_warmup_seconds', 'Warm-up prediction time of the active model',
+              function=active_model_value('warmup_seconds'))
+metrics.gauge('crimesafe_model_artifact_bytes', 'On-disk size of the active model artifact',
+              function=active_model_value('artifact_bytes'))
+metrics.gauge('crimesafe_model_loaded_timestamp_seconds', 'Unix time the active model was loaded',
+              function=active_model_value('loaded_at'))
 
-    predictions = []
 
-    for city in all_cities:
+# Result cache for /predict: "grid" precomputes every accepted (age, gender, year)
+# profile in a background thread, "lru" keeps the most recent results
+PREDICT_CACHE = os.environ.get('PREDICT_CACHE', 'off').lower()
+PREDICT_CACHE_SIZE = int(os.environ.get('PREDICT_CACHE_SIZE', 512))
+
+class PredictionCache:
+    """Serves /predict scores from a precomputed grid or a bounded LRU, reset whenever the registry swaps models.
+
+    The grid is built in a background thread of each process that serves requests.
+    Threads don't survive fork, so under gunicorn --preload a worker whose master
+    hadn't finished the grid starts its own build on its first lookup. With
+    SHARED_ARTIFACTS_DIR that build maps the grid another process published.
+    """
+
+    def __init__(self, mode, max_size):
+        self.mode = mode if mode in ('grid', 'lru') else 'off'
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.grid = None
+        self.entries = OrderedDict()
+        self.version = None
+        self.loaded = None
+        self.build_pid = None  # process whose thread builds the grid for self.loaded
+        self.lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # The lock may have been held by a parent thread that doesn't exist here
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+
+    def reset(self, loaded):
+        """Drop cached results and start over for a newly activated model"""
+        with self.lock:
+            if self.version is not None:
+                self.invalidations += 1
+            self.grid = None
+            self.entries.clear()
+            self.version = loaded.version if loaded is not None else None
+            self.loaded = loaded
+            self.build_pid = None
+        self._start_build()
+
+    def _start_build(self):
+        """Build the grid for the current model in this process, unless a build already started here"""
+        with self.lock:
+            loaded = self.loaded
+            if self.mode != 'grid' or loaded is None or self.grid is not None or self.build_pid == os.getpid():
+                return
+            self.build_pid = os.getpid()
+        threading.Thread(target=self._build_grid, args=(loaded,), daemon=True).start()
+
+    def _build_grid(self, loaded):
         try:
-            # Build feature vector
-            features = {}
-            features['Victim Age'] = age
-            features['Year'] = year
-
-            # Encode categorical features if label_encoders exist
-            if label_encoders.get('City'):
-                features['City'] = label_encoders['City'].transform([city])[0]
-            if label_encoders.get('Victim Gender'):
-                features['Victim Gender'] = label_encoders['Victim Gender'].transform([gender])[0]
-
-            # Age group
-            if age <= 18:
-                age_group = '0-18'
-            elif age <= 25:
-                age_group = '19-25'
-            elif age <= 35:
-                age_group = '26-35'
-            elif age <= 45:
-                age_group = '36-45'
-            elif age <= 55:
-                age_group = '46-55'
-            elif age <= 65:
-                age_group = '56-65'
+            if SHARED_ARTIFACTS_DIR:
+                grid = ScoreGrid.shared(loaded.feature_table, loaded.model,
+                                        shared_dir(SHARED_ARTIFACTS_DIR, loaded.fingerprint))
             else:
-                age_group = '65+'
+                grid = ScoreGrid(loaded.feature_table, loaded.model)
+        except Exception as e:
+            print(f"Error building prediction grid: {e}")
+            ERRORS.inc(stage='grid')
+            return
+        with self.lock:
+            if self.version == loaded.version:
+                self.grid = grid
+        print(f"✅ Prediction grid ready: {len(grid)} profiles x {len(loaded.feature_table)} cities")
 
-            if label_encoders.get('Age_Group'):
-                features['Age_Group'] = label_encoders['Age_Group'].transform([age_group])[0]
+    def get(self, version, age, gender, year):
+        """Cached (cities, scores) for a profile, or None on a miss"""
+        if not self.enabled:
+            return None
+        if self.mode == 'grid' and self.grid is None:
+            self._start_build()
+        key = (age, gender, year)
+        cached = None
+        with self.lock:
+            if self.version == version:
+                if self.mode == 'grid' and self.grid is not None:
+                    cached = self.grid.lookup(age, gender, year)
+                elif self.mode == 'lru':
+                    cached = self.entries.get(key)
+                    if cached is not None:
+                        self.entries.move_to_end(key)
+            if cached is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return cached
 
-            # City statistics
-            features['Total_Crimes'] = city_stats.get('Total_Crimes', {}).get(city, 0)
-            features['Avg_Victim_Age'] = city_stats.get('Avg_Victim_Age', {}).get(city, 0)
-            features['City_Crime_Density'] = city_stats.get('City_Crime_Density', {}).get(city, 0)
+    def put(self, version, age, gender, year, cities, scores):
+        if self.mode != 'lru':
+            return
+        key = (age, gender, year)
+        with self.lock:
+            # Results scored by a model that was swapped out meanwhile are dropped
+            if self.version != version:
+                return
+            self.entries[key] = (cities, scores)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
 
-            # Create feature vector
-            if feature_columns:
-                feature_vector = [features.get(col, 0) for col in feature_columns]
-            else:
-                # If no feature_columns saved, use all features
-                feature_vector = list(features.values())
+    def stats(self):
+        with self.lock:
+            entries = len(self.entries)
+            if self.grid is not None:
+                entries = len(self.grid)
+            return {
+                "mode": self.mode,
+                "ready": self.mode == 'lru' or self.grid is not None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "entries": entries,
+            }
 
-            # Predict
-            safety_score = model.predict([feature_vector])[0]
-            safety_score = max(0, min(100, safety_score))  # Clamp 0-100
+prediction_cache = PredictionCache(PREDICT_CACHE, PREDICT_CACHE_SIZE)
+prediction_cache.reset(registry.active)
+registry.listeners.append(prediction_cache.reset)
+metrics.counter('crimesafe_prediction_cache_lookups_total', 'Prediction cache lookups by result', ('result',),
+                function=lambda: {(result,): prediction_cache.stats()[result] for result in ('hits', 'misses')})
+metrics.gauge('crimesafe_prediction_cache_entries', 'Profiles held by the prediction cache',
+              function=lambda: {(): prediction_cache.stats()['entries']})
 
-            predictions.append({
-                'city': city,
-                'safety_score': round(float(safety_score), 2),
-                'age': age,
-                'gender': gender,
-                'year': year
-            })
+# Request metrics; after_request hooks run in reverse order of registration, so
+# record_request (registered first) also times compress_response
+@app.before_request
+def start_request():
+    g.request_started = time.perf_counter()
+    if profiler is not None:
+        profiler.begin()
 
-        except Exception as e:
-            print(f"Error predicting for city {city}: {e}")
-            continue
+@app.after_request
+def record_request(response):
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, endpoint=endpoint)
+    return response
+
+@app.teardown_request
+def finish_request(exc):
+    # Runs after a streamed response has been fully sent
+    if profiler is not None:
+        profiler.end()
+
+# Prediction function
+def profile_scores(age, gender, year):
+    """(cities, rounded scores) for one profile from the active model, via the result cache"""
+    # New versions in models/ (or a model file swapped in by os.replace) are picked up here
+    registry.check()
+    current = registry.active
+    if current is None:
+        raise Exception("Model not loaded")
 
-    return predictions
+    with STAGE_SECONDS.time(stage='cache'):
+        cached = prediction_cache.get(current.version, age, gender, year)
+    if cached is not None:
+        return cached
+    cities, safety_scores = score_cities(current, age, gender, year)
+    prediction_cache.put(current.version, age, gender, year, cities, safety_scores)
+    return cities, safety_scores
+
+def score_cities(current, age, gender, year):
+    """Score every city for one profile with a loaded model; returns (cities, rounded scores)"""
+    table, scorer = current.feature_table, current.model
+    if len(table) == 0:
+        return [], []
+    with STAGE_SECONDS.time(stage='features'):
+        features = table.fill(age, gender, year)
+    if features is None:
+        print(f"Error predicting: unseen gender {gender!r} or age group for age {age}")
+        ERRORS.inc(stage='features')
+        return [], []
+
+    # Score every city in a single call
+    try:
+        with STAGE_SECONDS.time(stage='predict'):
+            safety_scores = round_scores(clamp_scores(scorer.predict(features)))
+    except Exception as e:
+        print(f"Error predicting city batch: {e}")
+        ERRORS.inc(stage='predict')
+        return [], []
+
+    return list(table.cities), safety_scores
 
 
 # API routes
 @app.route('/health')
 def health():
-    return jsonify({"status": "healthy", "model_loaded": model is not None})
+    return jsonify(health_status())
+
+def health_status():
+    current = registry.active
+    return {
+        "status": "healthy",
+        "model_loaded": current is not None,
+        "model_version": current.version if current is not None else None,
+        "prediction_cache": prediction_cache.stats(),
+        "explanations": current.explainer.stats() if current is not None and current.explainer else None,
+        "profiler": profiler.stats() if profiler is not None else None
+    }
+
+@app.route('/models')
+def get_models():
+    """Active model version, load/warm-up times and recent swaps"""
+    return jsonify(registry.describe())
+
+def cities_etag(current):
+    """/cities ETag, which changes only when the model version does"""
+    version = current.version if current is not None else ''
+    return hashlib.sha1(version.encode()).hexdigest()[:16]
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus metrics: request counts and latencies, per-stage timings, model load and cache stats"""
+    return Response(metrics.render(), content_type=MetricsRegistry.CONTENT_TYPE)
+
+@app.route('/debug/profile')
+def get_profile():
+    """Collapsed stacks from the sampling profiler (flamegraph.pl/speedscope input); ?reset=1 starts over"""
+    if profiler is None:
+        return jsonify({"error": "Sampling profiler is off; start the app with PROFILER_INTERVAL_MS set"}), 404
+    stacks = profiler.collapsed()
+    if request.args.get('reset') in ('1', 'true'):
+        profiler.reset()
+    return Response(stacks, content_type='text/plain; charset=utf-8')
 
 @app.route('/cities')
 def get_cities():
-    return jsonify({"cities": all_cities})
+    """City list, revalidated with an ETag keyed on the model version"""
+    current = registry.active
+    response = jsonify({"cities": current.all_cities if current is not None else []})
+    # Weak, since the gzip and br encodings of the list are different bytes
+    response.set_etag(cities_etag(current), weak=True)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def parse_profile(data):
+    """Validate age/gender/year from a request body; returns (profile, error message)"""
+    if not data:
+        return None, "No JSON data provided"
+
+    age = data.get('age')
+    gender = data.get('gender')
+    year = data.get('year', 2024)
+
+    if age is None or gender is None:
+        return None, "Missing required parameters: age and gender"
+    if not (0 <= age <= 100):
+        return None, "Age must be between 0 and 100"
+    if gender.upper() not in ['M', 'F']:
+        return None, "Gender must be 'M' or 'F'"
+    if not (2020 <= year <= 2030):
+        return None, "Year must be between 2020 and 2030"
+    return (age, gender.upper(), year), None
+
+def parse_ranking(data):
+    """top_k (default 5), include_all and format ("records" or "columnar") from a request body.
+
+    Returns ((top_k, include_all, columnar), error message).
+    """
+    top_k = data.get('top_k', DEFAULT_TOP_K)
+    include_all = data.get('include_all', False)
+    response_format = data.get('format', 'records')
+    if isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 1:
+        return None, "top_k must be a positive integer"
+    if not isinstance(include_all, bool):
+        return None, "include_all must be true or false"
+    if response_format not in ('records', 'columnar'):
+        return None, "format must be 'records' or 'columnar'"
+    return (top_k, include_all, response_format == 'columnar'), None
+
+def prediction_response(age, gender, year, top_k=DEFAULT_TOP_K, include_all=False, columnar=False):
+    """Ranked /predict response body for a validated profile; None if no city could be scored.
+
+    Only the top_k safest and most dangerous cities are ranked and serialized,
+    unless include_all asks for the full ranking as well. columnar lists each
+    ranking as parallel city/safety_score/rank arrays instead of one dict per
+    city repeating the profile.
+    """
+    cities, safety_scores = profile_scores(age, gender, year)
+    return ranked_response(age, gender, year, cities, safety_scores, top_k, include_all, columnar)
+
+def ranked_response(age, gender, year, cities, safety_scores, top_k=DEFAULT_TOP_K, include_all=False,
+                    columnar=False):
+    """prediction_response for scores already computed; None if there are none"""
+    if not cities:
+        return None
+    with STAGE_SECONDS.time(stage='rank'):
+        return _ranked_response(age, gender, year, cities, safety_scores, top_k, include_all, columnar)
+
+def _ranked_response(age, gender, year, cities, safety_scores, top_k, include_all, columnar):
+    scores = np.asarray(safety_scores, dtype=np.float64)
+    n = len(scores)
+
+    def ranked(order, ranks):
+        if columnar:
+            return {
+                'city': [cities[i] for i in order],
+                'safety_score': scores[order].tolist(),
+                'rank': list(ranks[:len(order)])
+            }
+        return [
+            {
+                'city': cities[i],
+                'safety_score': float(scores[i]),
+                'age': age,
+                'gender': gender,
+                'year': year,
+                'rank': int(rank)
+            }
+            for i, rank in zip(order, ranks)
+        ]
+
+    # Same order and ranks as a stable descending sort of every city
+    safest = select_top_k(scores, top_k)
+    most_dangerous = select_top_k(-scores, top_k, tiebreak=-np.arange(n))
+    response = {
+        "input": {"age": age, "gender": gender, "year": year},
+        "safest_cities": ranked(safest, range(1, n + 1)),
+        "most_dangerous_cities": ranked(most_dangerous, range(n, 0, -1)),
+        "total_cities_analyzed": n
+    }
+    if include_all:
+        response["all_cities"] = ranked(ranked_order(scores), range(1, n + 1))
+    return response
 
 @app.route('/predict', methods=['POST'])
 def predict():
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "No JSON data provided"}), 400
-
-        age = data.get('age')
-        gender = data.get('gender')
-        year = data.get('year', 2024)
-
-        if age is None or gender is None:
-            return jsonify({"error": "Missing required parameters: age and gender"}), 400
-        if not (0 <= age <= 100):
-            return jsonify({"error": "Age must be between 0 and 100"}), 400
-        if gender.upper() not in ['M', 'F']:
-            return jsonify({"error": "Gender must be 'M' or 'F'"}), 400
-        if not (2020 <= year <= 2030):
-            return jsonify({"error": "Year must be between 2020 and 2030"}), 400
-
-        predictions = predict_city_safety(age, gender.upper(), year)
-        if not predictions:
+        with STAGE_SECONDS.time(stage='validate'):
+            data = request.get_json()
+            profile, error = parse_profile(data)
+            if not error:
+                ranking, error = parse_ranking(data)
+        if error:
+            return jsonify({"error": error}), 400
+
+        response = prediction_response(*profile, *ranking)
+        if response is None:
             return jsonify({"error": "No predictions generated"}), 500
 
-        # Sort and rank
-        predictions.sort(key=lambda x: x['safety_score'], reverse=True)
-        for i, pred in enumerate(predictions):
-            pred['rank'] = i + 1
+        with STAGE_SECONDS.time(stage='serialize'):
+            return jsonify(response)
 
-        response = {
-            "input": {"age": age, "gender": gender.upper(), "year": year},
-            "safest_cities": predictions[:5],
-            "most_dangerous_cities": predictions[-5:][::-1],
-            "total_cities_analyzed": len(predictions)
-        }
+    except Exception as e:
+        return jsonify({"error": f"Prediction failed: {str(e)}"}), 500
+
+
+def score_profiles(current, profiles):
+    """(cities, rounded scores) for each profile, scoring every cache miss in one predict call"""
+    table = current.feature_table
+    results = [([], [])] * len(profiles)
+    blocks, missed = [], []
+    for i, (age, gender, year) in enumerate(profiles):
+        cached = prediction_cache.get(current.version, age, gender, year)
+        if cached is not None:
+            results[i] = cached
+            continue
+        with STAGE_SECONDS.time(stage='features'):
+            features = table.fill(age, gender, year)
+        if features is not None and len(table):
+            blocks.append(features)
+            missed.append(i)
+    if not blocks:
+        return results
+
+    # Profiles x cities as one matrix
+    with STAGE_SECONDS.time(stage='predict'):
+        raw = clamp_scores(current.model.predict(np.vstack(blocks))).reshape(len(blocks), len(table))
+        rounded = [round_scores(row) for row in raw]
+    cities = list(table.cities)
+    for i, scores in zip(missed, rounded):
+        results[i] = (cities, scores)
+        prediction_cache.put(current.version, *profiles[i], *results[i])
+    return results
+
+def batch_lines(current, items, ranking):
+    """NDJSON lines, in input order, for (index, request dict or error) items, scored chunk by chunk"""
+    chunk_size = max(1, BATCH_CHUNK_ROWS // max(len(current.feature_table), 1))
+
+    def flush(chunk):
+        profiles = [profile for _, profile, _ in chunk if profile is not None]
+        try:
+            scored = iter(score_profiles(current, profiles))
+        except Exception as e:
+            ERRORS.inc(stage='predict')
+            scored, failed = None, f"Prediction failed: {str(e)}"
+        for index, profile, error in chunk:
+            if profile is not None:
+                if scored is None:
+                    error = failed
+                else:
+                    body = ranked_response(*profile, *next(scored), *ranking)
+                    if body is None:
+                        error = "No predictions generated"
+            line = {"index": index, "error": error} if error else {"index": index, **body}
+            yield app.json.dumps(line) + "\n"
 
-        return jsonify(response)
+    chunk, pending = [], 0
+    for index, data in items:
+        if index >= MAX_BATCH_PROFILES:
+            chunk.append((index, None, f"Batches are limited to {MAX_BATCH_PROFILES} profiles"))
+            break
+        profile, error = None, data
+        if isinstance(data, dict):
+            try:
+                profile, error = parse_profile(data)
+            except (TypeError, AttributeError):
+                error = "Invalid age, gender or year"
+        chunk.append((index, profile, error))
+        pending += profile is not None
+        if pending >= chunk_size:
+            yield from flush(chunk)
+            chunk, pending = [], 0
+    yield from flush(chunk)
+
+def ndjson_items(stream):
+    """(index, dict or error message) for each non-blank line of an NDJSON request body"""
+    index = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+            if not isinstance(data, dict):
+                data = "Each profile must be a JSON object"
+        except ValueError:
+            data = "Invalid JSON line"
+        yield index, data
+        index += 1
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """Rank cities for many profiles in one request, streamed back as NDJSON.
+
+    The body is a JSON array of profiles (or {"profiles": [...]}), or NDJSON with
+    one profile per line (Content-Type: application/x-ndjson), which is read as it
+    arrives. Each output line is the /predict response for one profile plus its
+    "index" in the input, or {"index", "error"}. top_k/include_all/format come
+    from the query string or, for JSON bodies, the body object.
+    """
+    options = {}
+    if 'top_k' in request.args:
+        options['top_k'] = request.args.get('top_k', type=int)
+    if 'include_all' in request.args:
+        options['include_all'] = request.args['include_all'].lower() in ('1', 'true', 'yes')
+    if 'format' in request.args:
+        options['format'] = request.args['format']
+
+    if request.mimetype in NDJSON_MIMETYPES:
+        items = ndjson_items(request.stream)
+    else:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            options.update({key: data[key] for key in ('top_k', 'include_all', 'format') if key in data})
+            data = data.get('profiles')
+        if not isinstance(data, list):
+            return jsonify({"error": "Expected a JSON array of profiles, {\"profiles\": [...]} or NDJSON"}), 400
+        if len(data) > MAX_BATCH_PROFILES:
+            return jsonify({"error": f"Batches are limited to {MAX_BATCH_PROFILES} profiles"}), 413
+        items = ((i, profile if isinstance(profile, dict) else "Each profile must be a JSON object")
+                 for i, profile in enumerate(data))
+
+    ranking, error = parse_ranking(options)
+    if error:
+        return jsonify({"error": error}), 400
+
+    registry.check()
+    current = registry.active  # one model version for the whole batch
+    if current is None:
+        return jsonify({"error": "Model not loaded"}), 503
+
+    response = Response(stream_with_context(batch_lines(current, items, ranking)), mimetype='application/x-ndjson')
+    response.headers['X-Model-Version'] = current.version
+    return response
+
+
+@app.route('/explain', methods=['POST'])
+def explain():
+    """SHAP contributions behind one city's (or every city's) score for a profile"""
+    try:
+        data = request.get_json()
+        profile, error = parse_profile(data)
+        if error:
+            return jsonify({"error": error}), 400
+        age, gender, year = profile
+        city = data.get('city')
+        approximate = bool(data.get('approximate', False))
+
+        registry.check()
+        current = registry.active
+        if current is None:
+            return jsonify({"error": "Model not loaded"}), 503
+        table, explainer = current.feature_table, current.explainer
+        if explainer is None:
+            return jsonify({"error": "Explanations are not available for the loaded model"}), 503
+
+        features = table.fill(age, gender, year)
+        if features is None:
+            return jsonify({"error": "Profile cannot be encoded by the loaded model"}), 400
+        cities = list(table.cities)
+        if city is not None:
+            if city not in cities:
+                return jsonify({"error": f"Unknown city: {city}"}), 404
+            rows = [cities.index(city)]
+        else:
+            rows = list(range(len(cities)))
+
+        # explain() takes at most max_rows rows per call
+        explanations = []
+        with STAGE_SECONDS.time(stage='explain'):
+            for start in range(0, len(rows), explainer.max_rows):
+                chunk = rows[start:start + explainer.max_rows]
+                explanations.extend(explainer.explain(features[chunk], approximate=approximate))
+        scores = round_scores(clamp_scores([e['prediction'] for e in explanations]))
+        return jsonify({
+            "input": {"age": age, "gender": gender, "year": year},
+            "model_version": explainer.model_version,
+            "approximate": approximate,
+            "explanations": [
+                {"city": cities[row], "safety_score": score, **explanation}
+                for row, score, explanation in zip(rows, scores, explanations)
+            ],
+        })
 
     except Exception as e:
-        return jsonify({"error": f"Prediction failed: {str(e)}"}), 500
+        return jsonify({"error": f"Explanation failed: {str(e)}"}), 500
+
+
+class TimeSeriesExplanations:
+    """One long-lived TimeSeriesExplainer for the newest time-series model in models/.
+
+    The models/ listing is checked at most once a second; a newer artifact
+    replaces the explainer, and with it the explanation cache.
+    """
+
+    def __init__(self, models_dir):
+        self.models_dir = models_dir
+        self.explainer = None
+        self.last_check = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        """The explainer for the newest artifact; raises if there is none or it can't be loaded"""
+        with self.lock:
+            now = time.monotonic()
+            if self.explainer is None or now - self.last_check >= 1.0:
+                self.last_check = now
+                path = latest_time_series_artifact(self.models_dir)
+                if path is None:
+                    raise FileNotFoundError("No time-series model found")
+                if self.explainer is None or self.explainer.path != path:
+                    self.explainer = TimeSeriesExplainer(path)
+            return self.explainer
+
+time_series_explanations = TimeSeriesExplanations(MODELS_DIR)
+
+@app.route('/explain/location', methods=['POST'])
+def explain_location():
+    """SHAP contributions behind the time-series model's prediction for one location and month"""
+    data = request.get_json(silent=True) or {}
+    try:
+        location_id = str(data['location_id'])
+        year, month = int(data['year']), int(data['month'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "location_id, year and month are required"}), 400
+    if not 1 <= month <= 12:
+        return jsonify({"error": "month must be between 1 and 12"}), 400
+
+    try:
+        explainer = time_series_explanations.get()
+    except Exception as e:
+        return jsonify({"error": f"Time-series explanations unavailable: {e}"}), 503
+    try:
+        with STAGE_SECONDS.time(stage='explain'):
+            explanation = explainer.explain(location_id, year, month, approximate=bool(data.get('approximate', False)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": f"Explanation failed: {str(e)}"}), 500
+    return jsonify(explanation)
+
+
+def preferred_encoding(accept_encodings):
+    """'br' (if brotli is installed), 'gzip' or None, by the client's Accept-Encoding preferences"""
+    return accept_encodings.best_match(['br', 'gzip'] if brotli is not None else ['gzip'])
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=COMPRESS_LEVEL)
+
+@app.after_request
+def compress_response(response):
+    """Compress JSON bodies of at least COMPRESS_MIN_BYTES with the client's preferred encoding"""
+    if (response.direct_passthrough or response.is_streamed or response.status_code < 200
+            or response.status_code in (204, 304) or 'Content-Encoding' in response.headers
+            or response.mimetype != 'application/json'):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = preferred_encoding(request.accept_encodings)
+    data = response.get_data()
+    if encoding is None or len(data) < COMPRESS_MIN_BYTES:
+        return response
+    with STAGE_SECONDS.time(stage='compress'):
+        response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
 
 
 # Optional web interface route
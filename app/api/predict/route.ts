@@ -1,9 +1,6 @@
 import { type NextRequest, NextResponse } from "next/server"
 import { prisma } from "@/lib/db"
-import { exec } from "child_process"
-import { promisify } from "util"
-
-const execAsync = promisify(exec)
+import { predictSafety } from "@/lib/predict-worker"
 
 interface LocationForecastRequest {
   type: "location_forecast"
@@ -154,24 +151,9 @@ async function handleLocationForecast(request: LocationForecastRequest) {
 async function handlePersonalizedRecommend(request: PersonalizedRecommendRequest) {
   const { name, age, gender, lat, lon, radius_km, top_n, year } = request
 
-  // Execute the Python script to get personalized recommendations
+  // Ask the persistent Python worker for personalized recommendations
   try {
-    const { stdout, stderr } = await execAsync(
-      `python scripts/predict_safety.py ${age} ${gender} ${year}`,
-    )
-
-    if (stderr) {
-      console.error(`Python script stderr: ${stderr}`)
-      return NextResponse.json(
-        {
-          success: false,
-          error: "Error from prediction script",
-        },
-        { status: 500 },
-      )
-    }
-
-    const pythonOutput = JSON.parse(stdout)
+    const pythonOutput = await predictSafety(age, gender, year, { lat, lon, radius_km, top_n })
 
     if (!pythonOutput.success) {
       return NextResponse.json(
@@ -183,21 +165,38 @@ async function handlePersonalizedRecommend(request: PersonalizedRecommendRequest
       )
     }
 
-    // Process the predictions from Python script
-    const predictions = pythonOutput.predictions.map((p: any) => ({
-      location_name: p.City,
-      safety_score: p.Predicted_Safety_Score,
-      safety_rank: p.Safety_Rank,
-      // We don't have lat/lon from python script, so use dummy or fetch from DB if needed
-      // For now, we'll just use 0,0 and rely on the frontend for map display for now
-      latitude: 0,
-      longitude: 0,
-      distance_km: 0, // Not calculated in Python script
-      zone_classification: "unknown", // Not calculated in Python script
-      avg_crime_count: 0, // Not calculated in Python script
-      confidence: 1, // Placeholder
-      explanation: "Predicted by ML model based on your profile.",
-    }))
+    // Locations within radius_km of the search point, top_n by predicted safety score.
+    // Models trained without location coordinates return the top_n cities instead.
+    const radiusApplied = Array.isArray(pythonOutput.recommendations)
+    const predictions = radiusApplied
+      ? pythonOutput.recommendations.map((p: any) => ({
+          location_id: p.Location_Id,
+          location_name: p.Location_Name,
+          city: p.City,
+          safety_score: p.Predicted_Safety_Score,
+          safety_rank: p.Safety_Rank,
+          latitude: p.Latitude,
+          longitude: p.Longitude,
+          distance_km: p.Distance_Km,
+          zone_classification: "unknown", // Not calculated in Python script
+          avg_crime_count: 0, // Not calculated in Python script
+          confidence: 1, // Placeholder
+          explanation: "Predicted by ML model based on your profile.",
+        }))
+      : (pythonOutput.predictions ?? []).map((p: any) => ({
+          location_name: p.City,
+          city: p.City,
+          safety_score: p.Predicted_Safety_Score,
+          safety_rank: p.Safety_Rank,
+          // City-level ranking: no coordinates or distances from the Python script
+          latitude: 0,
+          longitude: 0,
+          distance_km: 0,
+          zone_classification: "unknown", // Not calculated in Python script
+          avg_crime_count: 0, // Not calculated in Python script
+          confidence: 1, // Placeholder
+          explanation: "Predicted by ML model based on your profile.",
+        }))
 
     return NextResponse.json({
       success: true,
@@ -210,7 +209,8 @@ async function handlePersonalizedRecommend(request: PersonalizedRecommendRequest
         radius_km,
       },
       recommendations: predictions,
-      total_locations_analyzed: predictions.length,
+      radius_applied: radiusApplied,
+      total_locations_analyzed: pythonOutput.locations_in_radius ?? predictions.length,
     })
   } catch (error: any) {
     console.error("Error calling Python prediction script:", error)
@@ -0,0 +1,298 @@
+# asgi.py
+"""
+ASGI serving mode for the prediction API.
+Serves /health, /cities and /predict from the same model registry and result
+cache as the Flask app in app.py, which stays unchanged for compatibility.
+/predict bodies are parsed, scored and encoded in a bounded thread pool:
+ASGI_WORKERS requests run at once, up to ASGI_MAX_QUEUE more wait, and beyond
+that requests get 503 with Retry-After right away instead of piling up.
+Queue depth, rejections and wait times are reported under "executor" on /health
+and, with request counts and latencies, as Prometheus metrics on /metrics.
+
+Usage: uvicorn asgi:application --host 0.0.0.0 --port 5000
+   or: python asgi.py
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.http import parse_accept_header, parse_etags
+
+from app import (
+    COMPRESS_MIN_BYTES, REQUEST_SECONDS, REQUESTS, STAGE_SECONDS, MetricsRegistry, cities_etag, compress,
+    health_status, json_bytes, metrics, parse_profile, parse_ranking, preferred_encoding, prediction_response,
+    profiler, registry
+)
+
+ASGI_WORKERS = int(os.environ.get('ASGI_WORKERS', min(4, os.cpu_count() or 1)))
+ASGI_MAX_QUEUE = int(os.environ.get('ASGI_MAX_QUEUE', 32))
+MAX_BODY_BYTES = 64 * 1024
+RETRY_AFTER_SECONDS = 1
+
+
+class BoundedExecutor:
+    """Thread pool that rejects work once workers + max_queue jobs are outstanding"""
+
+    def __init__(self, workers, max_queue):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='predict')
+        self.lock = threading.Lock()
+        self.pending = 0  # submitted and not finished: running + queued
+        self.running = 0
+        self.peak_queue_depth = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    def submit(self, fn, *args):
+        """Awaitable result of fn(*args) in the pool, or None if the queue is full"""
+        with self.lock:
+            if self.pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                return None
+            self.pending += 1
+            self.peak_queue_depth = max(self.peak_queue_depth, self.pending - self.running)
+        future = self.pool.submit(self._run, time.perf_counter(), fn, args)
+        # Also runs when a queued job is cancelled because its client went away
+        future.add_done_callback(self._done)
+        return asyncio.wrap_future(future)
+
+    def _run(self, submitted, fn, args):
+        started = time.perf_counter()
+        with self.lock:
+            self.running += 1
+            self.wait_seconds += started - submitted
+        if profiler is not None:
+            profiler.begin()
+        try:
+            return fn(*args)
+        finally:
+            if profiler is not None:
+                profiler.end()
+            with self.lock:
+                self.running -= 1
+                self.run_seconds += time.perf_counter() - started
+
+    def _done(self, future):
+        with self.lock:
+            self.pending -= 1
+            if not future.cancelled():
+                self.completed += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "running": self.running,
+                "queue_depth": self.pending - self.running,
+                "peak_queue_depth": self.peak_queue_depth,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(1000 * self.wait_seconds / self.completed, 3) if self.completed else 0.0,
+                "avg_run_ms": round(1000 * self.run_seconds / self.completed, 3) if self.completed else 0.0,
+            }
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+executor = BoundedExecutor(ASGI_WORKERS, ASGI_MAX_QUEUE)
+
+def executor_value(name):
+    return lambda: {(): executor.stats()[name]}
+
+metrics.gauge('crimesafe_executor_running', 'Prediction jobs running in the ASGI executor',
+              function=executor_value('running'))
+metrics.gauge('crimesafe_executor_queue_depth', 'Prediction jobs waiting for an ASGI executor worker',
+              function=executor_value('queue_depth'))
+metrics.counter('crimesafe_executor_completed_total', 'Prediction jobs finished by the ASGI executor',
+                function=executor_value('completed'))
+metrics.counter('crimesafe_executor_rejected_total', 'Prediction requests rejected with 503 by the ASGI executor',
+                function=executor_value('rejected'))
+
+
+def encode(body):
+    # Same bytes as the Flask app's jsonify
+    return json_bytes(body)
+
+def predict_job(body):
+    """Parse, score and encode one /predict request body; returns (status, JSON bytes)"""
+    try:
+        with STAGE_SECONDS.time(stage='validate'):
+            try:
+                data = json.loads(body) if body else None
+            except ValueError:
+                return 400, encode({"error": "Invalid JSON body"})
+            if data is not None and not isinstance(data, dict):
+                return 400, encode({"error": "JSON body must be an object"})
+            profile, error = parse_profile(data)
+            if not error:
+                ranking, error = parse_ranking(data)
+        if error:
+            return 400, encode({"error": error})
+
+        response = prediction_response(*profile, *ranking)
+        if response is None:
+            return 500, encode({"error": "No predictions generated"})
+
+        with STAGE_SECONDS.time(stage='serialize'):
+            return 200, encode(response)
+
+    except Exception as e:
+        return 500, encode({"error": f"Prediction failed: {str(e)}"})
+
+
+def request_header(scope, name):
+    return dict(scope['headers']).get(name, b'').decode('latin-1')
+
+async def send_json(send, status, body, headers=(), scope=None):
+    """Send a JSON body, compressed as the Flask app does when scope (the request) is given"""
+    headers = [(b'access-control-allow-origin', b'*'), *headers]
+    if scope is not None and len(body) >= COMPRESS_MIN_BYTES:
+        encoding = preferred_encoding(parse_accept_header(request_header(scope, b'accept-encoding')))
+        headers.append((b'vary', b'Accept-Encoding'))
+        if encoding is not None:
+            body = compress(body, encoding)
+            headers.append((b'content-encoding', encoding.encode()))
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            *headers,
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def read_body(receive):
+    """Request body, or None if it exceeds MAX_BODY_BYTES or the client disconnected"""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+async def health(scope, receive, send):
+    status = health_status()
+    status["executor"] = executor.stats()
+    await send_json(send, 200, encode(status), scope=scope)
+
+async def cities(scope, receive, send):
+    current = registry.active
+    etag = cities_etag(current)
+    headers = [(b'etag', f'W/"{etag}"'.encode()), (b'cache-control', b'no-cache')]
+    if parse_etags(request_header(scope, b'if-none-match') or None).contains_weak(etag):
+        await send({'type': 'http.response.start', 'status': 304, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+    body = encode({"cities": current.all_cities if current is not None else []})
+    await send_json(send, 200, body, headers, scope=scope)
+
+async def predict(scope, receive, send):
+    body = await read_body(receive)
+    if body is None:
+        await send_json(send, 413, encode({"error": f"Request body larger than {MAX_BODY_BYTES} bytes"}))
+        return
+
+    job = executor.submit(predict_job, body)
+    if job is None:
+        await send_json(send, 503, encode({"error": "Server busy, retry shortly"}),
+                        [(b'retry-after', str(RETRY_AFTER_SECONDS).encode())])
+        return
+    status, response = await job
+    await send_json(send, status, response, scope=scope)
+
+async def get_metrics(scope, receive, send):
+    body = metrics.render().encode()
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', MetricsRegistry.CONTENT_TYPE.encode()),
+            (b'content-length', str(len(body)).encode()),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+ROUTES = {
+    '/health': ('GET', health),
+    '/cities': ('GET', cities),
+    '/metrics': ('GET', get_metrics),
+    '/predict': ('POST', predict),
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    # Same request metrics as the Flask app, labelled by route path
+    started = time.perf_counter()
+    endpoint = scope['path'] if scope['path'] in ROUTES else 'unmatched'
+
+    async def send_recorded(message):
+        if message['type'] == 'http.response.start':
+            REQUESTS.inc(endpoint=endpoint, method=scope['method'], status=message['status'])
+            REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+        await send(message)
+
+    await dispatch(scope, receive, send_recorded)
+
+async def dispatch(scope, receive, send):
+    route = ROUTES.get(scope['path'])
+    if route is None:
+        await send_json(send, 404, encode({"error": "Not found"}))
+        return
+    method, handler = route
+    if scope['method'] == 'OPTIONS':
+        # CORS preflight, matching flask_cors' allow-all defaults
+        requested = dict(scope['headers']).get(b'access-control-request-headers', b'')
+        await send_json(send, 200, b'', [
+            (b'access-control-allow-methods', f'{method}, OPTIONS'.encode()),
+            (b'access-control-allow-headers', requested),
+        ])
+        return
+    if scope['method'] != method:
+        await send_json(send, 405, encode({"error": "Method not allowed"}), [(b'allow', method.encode())])
+        return
+    await handler(scope, receive, send)
+
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("The ASGI server needs uvicorn: pip install uvicorn")
+    port = int(os.environ.get('PORT', 5000))
+    # One process: the model registry and caches live in this interpreter
+    uvicorn.run(application, host='0.0.0.0', port=port)
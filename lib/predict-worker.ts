@@ -0,0 +1,129 @@
+import { spawn, type ChildProcessWithoutNullStreams } from "child_process"
+import { createInterface } from "readline"
+
+// Long-lived `predict_safety.py --worker` process. The model is loaded once and
+// requests are exchanged as newline-delimited JSON, matched up by id.
+
+interface PendingRequest {
+  resolve: (value: any) => void
+  reject: (error: Error) => void
+  timer: NodeJS.Timeout
+  worker: ChildProcessWithoutNullStreams
+}
+
+const REQUEST_TIMEOUT_MS = Number(process.env.PREDICT_WORKER_TIMEOUT_MS || 30000)
+
+// Kept on globalThis so hot reloads in development reuse the same process
+const globalForWorker = globalThis as unknown as {
+  predictWorker: ChildProcessWithoutNullStreams | undefined
+  predictWorkerPending: Map<number, PendingRequest> | undefined
+}
+
+const pending = (globalForWorker.predictWorkerPending ??= new Map<number, PendingRequest>())
+let nextId = 1
+
+// Fail the requests sent to one worker; requests already sent to its replacement are kept
+function failPending(worker: ChildProcessWithoutNullStreams, error: Error) {
+  for (const [id, request] of pending) {
+    if (request.worker !== worker) continue
+    clearTimeout(request.timer)
+    request.reject(error)
+    pending.delete(id)
+  }
+}
+
+// Stop routing requests to a worker that exited, failed or stopped answering;
+// the next call spawns a new one
+function retireWorker(worker: ChildProcessWithoutNullStreams, error: Error) {
+  if (globalForWorker.predictWorker === worker) {
+    globalForWorker.predictWorker = undefined
+  }
+  failPending(worker, error)
+}
+
+function startWorker() {
+  const worker = spawn(process.env.PYTHON_BIN || "python", ["scripts/predict_safety.py", "--worker"])
+
+  createInterface({ input: worker.stdout }).on("line", (line) => {
+    let message: any
+    try {
+      message = JSON.parse(line)
+    } catch {
+      console.error(`Prediction worker sent invalid JSON: ${line}`)
+      return
+    }
+
+    if (message.id === undefined || message.id === null) {
+      if (message.error) {
+        // Errors without an id come from model loading, before the worker is ready
+        console.error(`Prediction worker error: ${message.error}`)
+        failPending(worker, new Error(message.error))
+      }
+      return
+    }
+
+    // Replies to requests that already timed out are dropped
+    const request = pending.get(message.id)
+    if (request && request.worker === worker) {
+      pending.delete(message.id)
+      clearTimeout(request.timer)
+      request.resolve(message)
+    }
+  })
+
+  worker.stderr.on("data", (data) => {
+    console.error(`Prediction worker stderr: ${data}`)
+  })
+
+  worker.on("exit", (code) => {
+    retireWorker(worker, new Error(`Prediction worker exited with code ${code}`))
+  })
+
+  worker.on("error", (error) => {
+    retireWorker(worker, error)
+  })
+
+  // Writing to a worker that is exiting fails with EPIPE; without a listener that
+  // error would be thrown from the stream and take down the server process
+  worker.stdin.on("error", (error) => {
+    retireWorker(worker, error)
+  })
+
+  return worker
+}
+
+function getWorker() {
+  if (!globalForWorker.predictWorker) {
+    globalForWorker.predictWorker = startWorker()
+  }
+  return globalForWorker.predictWorker
+}
+
+export interface RadiusQuery {
+  lat: number
+  lon: number
+  radius_km: number
+  top_n: number
+}
+
+// With a radius query the worker scores only locations within radius_km and returns the top_n
+export function predictSafety(age: number, gender: string, year: number, radius?: RadiusQuery): Promise<any> {
+  const worker = getWorker()
+  let id = nextId++
+  while (pending.has(id)) id = nextId++
+
+  return new Promise((resolve, reject) => {
+    const timer = setTimeout(() => {
+      pending.delete(id)
+      const error = new Error(`Prediction worker timed out after ${REQUEST_TIMEOUT_MS}ms`)
+      reject(error)
+      // Requests are answered in order, so everything queued behind this one is stuck too:
+      // replace the worker and fail its other requests instead of letting them time out
+      retireWorker(worker, error)
+      worker.kill()
+    }, REQUEST_TIMEOUT_MS)
+
+    pending.set(id, { resolve, reject, timer, worker })
+    worker.stdin.write(JSON.stringify({ id, age, gender, year, ...radius }) + "\n")
+  })
+}
@@ -0,0 +1,80 @@
+"""
+Benchmark for CrimeSafeTrainer feature engineering.
+Times the grouped add_location_features against the old per-location loop on
+synthetic monthly data and checks the two produce identical frames.
+
+Usage: python scripts/benchmark_features.py [location counts...] [--months N] [--loop-limit N]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from train import add_location_features
+
+
+def add_location_features_loop(df):
+    """The original per-location implementation, kept as the reference"""
+    features = []
+    for location_id in df['location_id'].unique():
+        loc_df = df[df['location_id'] == location_id].copy()
+        loc_df['lag_1'] = loc_df['crime_count'].shift(1)
+        loc_df['lag_3'] = loc_df['crime_count'].shift(3)
+        loc_df['lag_6'] = loc_df['crime_count'].shift(6)
+        loc_df['lag_12'] = loc_df['crime_count'].shift(12)
+        loc_df['rolling_mean_3'] = loc_df['crime_count'].rolling(window=3, min_periods=1).mean()
+        loc_df['rolling_std_3'] = loc_df['crime_count'].rolling(window=3, min_periods=1).std()
+        loc_df['rolling_mean_6'] = loc_df['crime_count'].rolling(window=6, min_periods=1).mean()
+        loc_df['trend'] = np.arange(len(loc_df))
+        features.append(loc_df)
+    return pd.concat(features, ignore_index=True)
+
+
+def synthetic_frame(n_locations, n_months, seed=42):
+    """Monthly aggregations for n_locations with uneven history lengths, sorted like engineer_features"""
+    rng = np.random.default_rng(seed)
+    months = rng.integers(max(1, n_months // 2), n_months + 1, size=n_locations)
+    location_id = np.repeat(np.arange(n_locations), months)
+    offset = np.concatenate([np.arange(m) for m in months])
+    df = pd.DataFrame({
+        'location_id': location_id,
+        'year': 2020 + offset // 12,
+        'month': offset % 12 + 1,
+        'crime_count': rng.poisson(25, size=len(location_id)),
+    })
+    return df.sort_values(['location_id', 'year', 'month'])
+
+
+def timed(fn, df):
+    start = time.perf_counter()
+    result = fn(df)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('locations', nargs='*', type=int, default=[1000, 10000, 100000])
+    parser.add_argument('--months', type=int, default=60)
+    parser.add_argument('--loop-limit', type=int, default=10000,
+                        help='skip the per-location loop above this many locations')
+    args = parser.parse_args()
+
+    print(f"{'locations':>10} {'rows':>10} {'grouped_s':>10} {'loop_s':>10} {'speedup':>8}  identical")
+    for n_locations in args.locations:
+        df = synthetic_frame(n_locations, args.months)
+        grouped, grouped_s = timed(add_location_features, df)
+
+        if n_locations <= args.loop_limit:
+            looped, loop_s = timed(add_location_features_loop, df)
+            pd.testing.assert_frame_equal(grouped, looped, check_exact=True)
+            loop_col, speedup, identical = f"{loop_s:10.2f}", f"{loop_s / grouped_s:7.1f}x", 'yes'
+        else:
+            loop_col, speedup, identical = f"{'-':>10}", f"{'-':>8}", '-'
+
+        print(f"{n_locations:>10} {len(df):>10} {grouped_s:10.3f} {loop_col} {speedup}  {identical}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark for recursive multi-horizon location forecasts.
+Fits a small time-series model on synthetic monthly data, then times
+RecursiveForecaster against a per-location pandas recompute of
+add_location_features for each step, and checks both give the same forecasts.
+
+Usage: python scripts/benchmark_forecast.py [--locations N] [--horizon N] [--reference-limit N]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.preprocessing import StandardScaler
+
+from benchmark_features import synthetic_frame
+from train import add_location_features
+from zone_forecast import STATIC_FEATURES, RecursiveForecaster, latest_history
+
+FEATURE_COLS = [
+    'lag_1', 'lag_3', 'lag_6', 'lag_12',
+    'rolling_mean_3', 'rolling_std_3', 'rolling_mean_6',
+    'trend', 'month_sin', 'month_cos', 'is_summer', 'is_winter',
+    'lat_norm', 'lon_norm', 'female_ratio', 'avg_victim_age',
+]
+
+
+def engineered_frame(n_locations, n_months, seed=42):
+    """Synthetic monthly rows with the engineer_features columns the model uses"""
+    df = add_location_features(synthetic_frame(n_locations, n_months, seed))
+    rng = np.random.default_rng(seed)
+    per_location = {col: rng.random(n_locations) for col in STATIC_FEATURES}
+    location = df['location_id'].to_numpy()
+    for col in STATIC_FEATURES:
+        df[col] = per_location[col][location]
+    df['month_sin'] = np.sin(2 * np.pi * df['month'] / 12)
+    df['month_cos'] = np.cos(2 * np.pi * df['month'] / 12)
+    df['is_summer'] = df['month'].isin([4, 5, 6]).astype(int)
+    df['is_winter'] = df['month'].isin([12, 1, 2]).astype(int)
+    return df
+
+
+def reference_forecast(df, model, scaler, horizon):
+    """One location at a time: append a row per step and recompute its features with pandas"""
+    forecasts = []
+    for _, loc_df in df.groupby('location_id', sort=True):
+        loc_df = loc_df[['location_id', 'year', 'month', 'crime_count'] + STATIC_FEATURES]
+        last = loc_df.iloc[-1]
+        for step in range(1, horizon + 1):
+            month_index = int(last['year']) * 12 + int(last['month']) - 1 + step
+            row = last.copy()
+            row['year'], row['month'] = month_index // 12, month_index % 12 + 1
+            row['crime_count'] = loc_df['crime_count'].iloc[-1]  # persistence until predicted
+            loc_df = pd.concat([loc_df, row.to_frame().T], ignore_index=True)
+            features = add_location_features(loc_df.astype({'crime_count': float}))
+            features['month_sin'] = np.sin(2 * np.pi * features['month'].astype(int) / 12)
+            features['month_cos'] = np.cos(2 * np.pi * features['month'].astype(int) / 12)
+            features['is_summer'] = features['month'].isin([4, 5, 6]).astype(int)
+            features['is_winter'] = features['month'].isin([12, 1, 2]).astype(int)
+            X = scaler.transform(features[FEATURE_COLS].iloc[[-1]].to_numpy(dtype=np.float64))
+            prediction = max(float(model.predict(X)[0]), 0.0)
+            loc_df.loc[loc_df.index[-1], 'crime_count'] = prediction
+            forecasts.append(prediction)
+    return np.array(forecasts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--locations', type=int, default=10000)
+    parser.add_argument('--months', type=int, default=36)
+    parser.add_argument('--horizon', type=int, default=12)
+    parser.add_argument('--reference-limit', type=int, default=50,
+                        help='locations to run through the per-location pandas reference')
+    args = parser.parse_args()
+
+    df = engineered_frame(args.locations, args.months)
+    train = df.dropna(subset=FEATURE_COLS)
+    scaler = StandardScaler()
+    X_train = scaler.fit_transform(train[FEATURE_COLS].to_numpy(dtype=np.float64))
+    model = xgb.XGBRegressor(n_estimators=100, max_depth=6, random_state=42)
+    model.fit(X_train, train['crime_count'])
+
+    start = time.perf_counter()
+    locations, counts = latest_history(df)
+    keys, predictions = RecursiveForecaster(model, scaler, FEATURE_COLS).forecast(locations, counts, args.horizon)
+    engine_s = time.perf_counter() - start
+    print(f"engine: {args.locations} locations x {args.horizon} months in {engine_s:.2f}s")
+
+    subset = df[df['location_id'] < args.reference_limit]
+    start = time.perf_counter()
+    expected = reference_forecast(subset, model, scaler, args.horizon)
+    reference_s = time.perf_counter() - start
+    subset_locations = min(args.reference_limit, args.locations)
+    got = predictions[:subset_locations].ravel()
+    np.testing.assert_allclose(got, expected, rtol=1e-5, atol=1e-4)
+    per_location = reference_s / subset_locations
+    print(f"pandas reference: {subset_locations} locations in {reference_s:.2f}s "
+          f"(~{per_location * args.locations:.0f}s projected for {args.locations}); forecasts match")
+
+
+if __name__ == '__main__':
+    main()
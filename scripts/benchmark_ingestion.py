@@ -0,0 +1,134 @@
+"""
+Benchmark for raw crime CSV ingestion (_load_raw_crime_data + _preprocess_safety_data).
+Compares the old untyped read_csv + per-row cleaning against the schema-based
+reader with each available engine, on the real CSV or a synthetic one, and
+checks both produce the same 2020-2023 training rows.
+
+Usage: python scripts/benchmark_ingestion.py [--csv crime_dataset_india.csv] [--rows N]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from train import TRAIN_YEARS, clean_raw_crime_data, pa_csv, read_raw_crime_csv
+
+CITIES = ['Agra', 'Ahmedabad', 'Bangalore', 'Delhi', 'Mumbai', 'Pune', 'Surat', 'Thane']
+CRIMES = ['IDENTITY THEFT', 'HOMICIDE', 'KIDNAPPING', 'BURGLARY', 'VANDALISM', 'FRAUD']
+WEAPONS = ['Blunt Object', 'Poison', 'Firearm', 'Knife', 'Other', None]
+DOMAINS = ['Violent Crime', 'Other Crime', 'Fire Accident', 'Traffic Fatality']
+
+
+def old_ingestion(csv_path):
+    """The original untyped read and per-row cleaning, kept as the reference"""
+    df_clean = pd.read_csv(csv_path).copy()
+    df_clean = df_clean.dropna()
+    df_clean = df_clean.drop_duplicates()
+    for col in ['Date Reported', 'Date of Occurrence']:
+        df_clean[col] = pd.to_datetime(df_clean[col], errors='coerce')
+    for col in ['City', 'Crime Description', 'Victim Gender', 'Weapon Used', 'Crime Domain']:
+        df_clean[col] = df_clean[col].astype(str).str.strip().str.title()
+    df_clean['Victim Age'] = pd.to_numeric(df_clean['Victim Age'], errors='coerce')
+    df_clean = df_clean[df_clean['Victim Age'].between(0, 100)]
+    df_clean['Year'] = df_clean['Date of Occurrence'].dt.year
+    return df_clean
+
+
+def new_ingestion(csv_path, engine):
+    return clean_raw_crime_data(read_raw_crime_csv(csv_path, engine=engine))
+
+
+def write_synthetic_csv(path, n_rows, seed=42):
+    """A CSV shaped like crime_dataset_india.csv, with missing weapons and open cases"""
+    rng = np.random.default_rng(seed)
+    occurred = pd.Timestamp('2020-01-01') + pd.to_timedelta(np.sort(rng.integers(0, 1670 * 24, n_rows)), unit='h')
+    reported = occurred + pd.to_timedelta(rng.integers(0, 72, n_rows), unit='h')
+    closed = rng.random(n_rows) < 0.5
+    fmt = '%m-%d-%Y %H:%M'
+    pd.DataFrame({
+        'Report Number': np.arange(1, n_rows + 1),
+        'Date Reported': reported.strftime(fmt),
+        'Date of Occurrence': occurred.strftime(fmt),
+        'Time of Occurrence': occurred.strftime(fmt),
+        'City': rng.choice(CITIES, n_rows),
+        'Crime Code': rng.integers(100, 999, n_rows),
+        'Crime Description': rng.choice(CRIMES, n_rows),
+        'Victim Age': rng.integers(10, 80, n_rows),
+        'Victim Gender': rng.choice(['M', 'F', 'X'], n_rows),
+        'Weapon Used': rng.choice(np.array(WEAPONS, dtype=object), n_rows),
+        'Crime Domain': rng.choice(DOMAINS, n_rows),
+        'Police Deployed': rng.integers(1, 20, n_rows),
+        'Case Closed': np.where(closed, 'Yes', 'No'),
+        'Date Case Closed': np.where(closed, (reported + pd.Timedelta(days=30)).strftime(fmt), None),
+    }).to_csv(path, index=False)
+
+
+def run_variant(variant, csv_path):
+    """Run one variant in this process and print its timings as JSON"""
+    start = time.perf_counter()
+    if variant == 'old':
+        df = old_ingestion(csv_path)
+    else:
+        df = new_ingestion(csv_path, engine=variant)
+    train_rows = df[df['Year'].isin(TRAIN_YEARS)]
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        'variant': variant,
+        'seconds': elapsed,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'frame_mb': df.memory_usage(deep=True).sum() / 1e6,
+        'train_rows': len(train_rows),
+        'train_checksum': int(train_rows['Report Number'].sum()),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', help='raw crime CSV; a synthetic one is generated when omitted')
+    parser.add_argument('--rows', type=int, default=400000, help='rows in the synthetic CSV')
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_variant(args.run, args.csv)
+        return
+
+    tmp_dir = None
+    csv_path = args.csv
+    if csv_path is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        csv_path = os.path.join(tmp_dir.name, 'crime_dataset_synthetic.csv')
+        write_synthetic_csv(csv_path, args.rows)
+
+    variants = ['old', 'c'] + (['pyarrow'] if pa_csv is not None else [])
+    results = []
+    for variant in variants:
+        # Fresh interpreter per variant so peak RSS is not shared between them
+        output = subprocess.run(
+            [sys.executable, __file__, '--run', variant, '--csv', csv_path],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    baseline = results[0]
+    print(f"CSV: {csv_path} ({os.path.getsize(csv_path) / 1e6:.1f} MB)")
+    print(f"{'variant':>8} {'seconds':>8} {'speedup':>8} {'peak_rss_mb':>12} {'frame_mb':>9} {'train_rows':>11}  same_rows")
+    for result in results:
+        same = result['train_rows'] == baseline['train_rows'] and result['train_checksum'] == baseline['train_checksum']
+        print(f"{result['variant']:>8} {result['seconds']:8.2f} {baseline['seconds'] / result['seconds']:7.1f}x "
+              f"{result['peak_rss_mb']:12.0f} {result['frame_mb']:9.1f} {result['train_rows']:>11}  {'yes' if same else 'NO'}")
+
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
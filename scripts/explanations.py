@@ -0,0 +1,199 @@
+"""
+On-demand SHAP explanations for CrimeSafe models.
+Tree models use XGBoost's built-in TreeSHAP (pred_contribs), or its fast
+approximation (approx_contribs) with approximate=True; linear models use the
+closed form coef * (x - background mean). Results are cached per model version
+and input row, so no SHAP values are computed or pickled at training time.
+Time-series explanations read the engineered feature rows train.py saves
+with each model.
+
+Usage: python scripts/explanations.py <location_id> <year> <month> [--approximate]
+"""
+
+import glob
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+EXPLAIN_CACHE_SIZE = 2048
+MAX_EXPLAIN_ROWS = 256  # rows per explain() call
+MODELS_DIR = 'models'  # where train.py writes the time-series artifacts
+
+
+class ExplanationService:
+    """Per-row feature contributions, cached with LRU eviction.
+
+    model is an XGBRegressor, a safety_model.BoosterModel or a fitted linear
+    model; background (rows x features) is only used by linear models.
+    """
+
+    def __init__(self, model, feature_names, model_version, background=None,
+                 cache_size=EXPLAIN_CACHE_SIZE, max_rows=MAX_EXPLAIN_ROWS):
+        self.feature_names = list(feature_names)
+        self.model_version = model_version
+        self.cache_size = cache_size
+        self.max_rows = max_rows
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.booster = None
+        self.iteration_range = (0, 0)
+        if hasattr(model, 'get_booster'):
+            self.booster = model.get_booster()
+            best_iteration = getattr(model, 'best_iteration', None)
+        elif hasattr(model, 'booster'):
+            self.booster = model.booster
+            best_iteration = model.best_iteration
+        if self.booster is not None:
+            if best_iteration is not None:
+                self.iteration_range = (0, int(best_iteration) + 1)
+        elif hasattr(model, 'coef_'):
+            self.coef = np.ravel(model.coef_).astype(np.float64)
+            mean = np.zeros(len(self.coef)) if background is None else np.asarray(background, dtype=np.float64).mean(axis=0)
+            self.background_mean = mean
+            self.base_value = float(np.ravel(model.intercept_)[0] + self.coef @ mean)
+        else:
+            raise TypeError(f"Cannot explain model of type {type(model).__name__}")
+
+    def _contributions(self, X, approximate):
+        """(rows, features + 1) contributions, the last column being the base value"""
+        if self.booster is not None:
+            import xgboost as xgb
+            return self.booster.predict(
+                xgb.DMatrix(X, feature_names=self.booster.feature_names),
+                pred_contribs=True, approx_contribs=approximate, iteration_range=self.iteration_range,
+            ).astype(np.float64)
+        contributions = (X - self.background_mean) * self.coef
+        return np.column_stack([contributions, np.full(len(X), self.base_value)])
+
+    def explain(self, features, approximate=False):
+        """Explain each row of features; returns one dict per row.
+
+        Each dict has the model output ('prediction'), the expected output
+        ('base_value') and per-feature 'contributions' summing to their difference.
+        """
+        X = np.atleast_2d(np.asarray(features, dtype=np.float64))
+        if X.shape[1] != len(self.feature_names):
+            raise ValueError(f"Expected {len(self.feature_names)} features, got {X.shape[1]}")
+        if len(X) > self.max_rows:
+            raise ValueError(f"Can explain at most {self.max_rows} rows per call, got {len(X)}")
+
+        keys = [(self.model_version, bool(approximate), row.tobytes()) for row in X]
+        results = [None] * len(X)
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    results[i] = self._cache[key]
+        missing = [i for i, result in enumerate(results) if result is None]
+
+        if missing:
+            contributions = self._contributions(X[missing], approximate)
+            for i, row in zip(missing, contributions):
+                base_value = float(row[-1])
+                results[i] = {
+                    'prediction': base_value + float(row[:-1].sum()),
+                    'base_value': base_value,
+                    'contributions': dict(zip(self.feature_names, row[:-1].tolist())),
+                }
+            with self._lock:
+                for i in missing:
+                    self._cache[keys[i]] = results[i]
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        with self._lock:
+            self.hits += len(X) - len(missing)
+            self.misses += len(missing)
+        return results
+
+    def stats(self):
+        return {
+            "model_version": self.model_version,
+            "entries": len(self._cache),
+            "max_entries": self.cache_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def latest_time_series_artifact(models_dir=MODELS_DIR):
+    """Newest xgboost_<version>.joblib under models_dir (versions sort by timestamp), or None"""
+    paths = sorted(glob.glob(os.path.join(models_dir, "xgboost_*.joblib")))
+    return paths[-1] if paths else None
+
+
+class TimeSeriesExplainer:
+    """Long-lived explanations of one time-series artifact's monthly location predictions.
+
+    Reads the engineered rows train.py saved next to the model
+    (features_<version>.joblib), so a request is an index lookup plus a cached
+    ExplanationService call; nothing is reloaded or re-engineered per request.
+    """
+
+    def __init__(self, artifact_path):
+        import joblib
+
+        self.path = artifact_path
+        name = os.path.basename(artifact_path)
+        self.version = name[len("xgboost_"):-len(".joblib")]
+        features_path = os.path.join(os.path.dirname(artifact_path), f"features_{self.version}.joblib")
+        if not os.path.exists(features_path):
+            raise FileNotFoundError(f"No saved feature rows for model {self.version}; re-run train.py")
+
+        artifact = joblib.load(artifact_path)
+        rows = joblib.load(features_path, mmap_mode='r')
+        if list(rows['feature_cols']) != list(artifact['feature_cols']):
+            raise ValueError(f"Saved feature rows do not match the features of model {self.version}")
+        self.features = rows['features']
+        self.crime_counts = rows['crime_count']
+        self.rows = {
+            key: i for i, key in enumerate(zip(rows['location_id'].tolist(), rows['year'].tolist(), rows['month'].tolist()))
+        }
+        # StandardScaler.transform, applied directly to the saved rows
+        self.mean = np.asarray(artifact['scaler'].mean_, dtype=np.float64)
+        self.scale = np.asarray(artifact['scaler'].scale_, dtype=np.float64)
+        self.service = ExplanationService(artifact['model'], artifact['feature_cols'], self.version)
+
+    def explain(self, location_id, year, month, approximate=False):
+        """Explanation of the model's prediction for one location and month, as scored in training"""
+        row = self.rows.get((str(location_id), int(year), int(month)))
+        if row is None:
+            raise ValueError(f"No scored monthly row for location {location_id} in {int(year)}-{int(month):02d}")
+        features = (np.asarray(self.features[row:row + 1]) - self.mean) / self.scale
+        explanation = self.service.explain(features, approximate=approximate)[0]
+        return {
+            'location_id': str(location_id),
+            'year': int(year),
+            'month': int(month),
+            'crime_count': float(self.crime_counts[row]),
+            'model_version': self.version,
+            'approximate': approximate,
+            **explanation,
+        }
+
+
+def explain_location_month(location_id, year, month, approximate=False, models_dir=MODELS_DIR):
+    """Explain the latest time-series model's prediction for one location and month"""
+    path = latest_time_series_artifact(models_dir)
+    if path is None:
+        raise FileNotFoundError(f"No time-series model found in {models_dir}")
+    return TimeSeriesExplainer(path).explain(location_id, year, month, approximate=approximate)
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != '--approximate']
+    if len(args) != 3:
+        print(json.dumps({"error": "Usage: explanations.py <location_id> <year> <month> [--approximate]"}))
+        sys.exit(1)
+    try:
+        result = explain_location_month(args[0], int(args[1]), int(args[2]), approximate='--approximate' in sys.argv)
+    except Exception as e:
+        result = {"error": str(e)}
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,239 @@
+"""
+In-process metrics and an optional sampling profiler for the prediction API.
+Counters, gauges and histograms are rendered in the Prometheus text exposition
+format (version 0.0.4), so serving /metrics needs no client library.
+SamplingProfiler periodically records the Python stacks of request threads as
+collapsed stacks, the input format of flamegraph.pl and speedscope.
+"""
+
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from contextlib import contextmanager
+
+# Seconds; spans cache hits (well under a millisecond) to cold batch scoring
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """One metric family; function, if given, returns {label values tuple: value} at render time"""
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """(suffix, label values, extra labels, value) tuples"""
+        values = self.function() if self.function is not None else self.values
+        with self.lock:
+            items = sorted(values.items())
+        for key, value in items:
+            yield '', key, (), value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total = self.values.get(key, (None, 0.0))
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+            counts[index] += 1
+            self.values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self.lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self.values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield '_bucket', key, (('le', _format_value(float(bound))),), cumulative
+            yield '_sum', key, (), total
+            yield '_count', key, (), cumulative
+
+
+class MetricsRegistry:
+    """Metric families rendered together on /metrics"""
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self.metrics = []
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=(), function=None):
+        return self._add(Counter(name, documentation, labelnames, function))
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        return self._add(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class SamplingProfiler:
+    """Counts the Python stacks of tracked threads every interval seconds.
+
+    Only threads inside track() are sampled, so idle server and watcher threads
+    don't drown out request work. collapsed() returns one "frame;frame;... count"
+    line per distinct stack, root first.
+    """
+
+    def __init__(self, interval, max_stacks=20000):
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.stacks = StackCounter()
+        self.samples = 0
+        self.dropped = 0
+        self.active = set()
+        self.lock = threading.Lock()
+        self.started_at = None
+
+    def start(self):
+        self.started_at = time.time()
+        threading.Thread(target=self._run, name='sampling-profiler', daemon=True).start()
+        return self
+
+    def begin(self):
+        """Start sampling the calling thread"""
+        with self.lock:
+            self.active.add(threading.get_ident())
+
+    def end(self):
+        with self.lock:
+            self.active.discard(threading.get_ident())
+
+    @contextmanager
+    def track(self):
+        self.begin()
+        try:
+            yield
+        finally:
+            self.end()
+
+    @staticmethod
+    def _stack(frame):
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ';'.join(reversed(frames))
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                active = set(self.active)
+            if not active:
+                continue
+            frames = sys._current_frames()
+            stacks = [self._stack(frames[thread_id]) for thread_id in active if thread_id in frames]
+            with self.lock:
+                for stack in stacks:
+                    if stack in self.stacks or len(self.stacks) < self.max_stacks:
+                        self.stacks[stack] += 1
+                    else:
+                        self.dropped += 1
+                self.samples += len(stacks)
+
+    def collapsed(self):
+        with self.lock:
+            return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def reset(self):
+        with self.lock:
+            self.stacks.clear()
+            self.samples = 0
+            self.dropped = 0
+            self.started_at = time.time()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "interval_seconds": self.interval,
+                "samples": self.samples,
+                "distinct_stacks": len(self.stacks),
+                "dropped": self.dropped,
+                "started_at": self.started_at,
+            }
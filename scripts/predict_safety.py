@@ -1,109 +1,245 @@
 import sys
 import json
-import joblib
-import pandas as pd
+import time
+
+_started = time.perf_counter()
+
+from safety_model import (
+    STAT_COLUMNS, CityFeatureTable, LocationIndex, clamp_scores, find_latest_bundle, load_bundle, ranked_order,
+    round_scores, top_k, training_means
+)
 import numpy as np
-from sklearn.preprocessing import LabelEncoder
+
+MODEL_PATH = 'city_safety_predictor_model.pkl'
+MODELS_DIR = 'models'
+
+# Startup timings, reported on stderr with --profile-startup
+startup_profile = {'imports_s': time.perf_counter() - _started}
+
+def load_model_data(path):
+    """Load the newest native bundle if train.py wrote one, else unpickle the model artifacts.
+    joblib (and whatever the pickle needs) is only imported on the fallback path."""
+    bundle_dir = find_latest_bundle(MODELS_DIR)
+    if bundle_dir is not None:
+        return load_bundle(bundle_dir)
+    import joblib
+    return joblib.load(path)
 
 # Load the trained model and encoders
 try:
-    model_data = joblib.load('city_safety_predictor_model.pkl')
+    _load_started = time.perf_counter()
+    model_data = load_model_data(MODEL_PATH)
+    startup_profile['model_load_s'] = time.perf_counter() - _load_started
     best_model = model_data['model']
     label_encoders = model_data['label_encoders']
     feature_columns = model_data['feature_columns']
     all_cities = model_data['all_cities']
-    train_features_stats = model_data['train_features_stats'] # For getting mean values
+    # Plain dict of training means; older artifacts only carry the describe() frame
+    train_feature_means = model_data.get('train_feature_means')
+    if train_feature_means is None:
+        train_feature_means = training_means(model_data['train_features_stats'], feature_columns)
+    # Compiled once: city codes and city stats in feature_columns order.
+    # Columns without city-specific values fall back to the training means.
+    feature_table = CityFeatureTable(
+        label_encoders, feature_columns, all_cities,
+        city_stats=model_data.get('city_stats'),
+        stat_columns=model_data.get('stat_columns', STAT_COLUMNS),
+        column_defaults=train_feature_means,
+    )
+    # Radius index over location_stats coordinates, when the artifacts carry them
+    location_index = None
+    location_city_rows = None
+    if model_data.get('locations'):
+        location_index = LocationIndex(model_data['locations'])
+        location_city_rows = location_index.city_rows(feature_table.cities)
+    startup_profile['total_s'] = time.perf_counter() - _started
 except FileNotFoundError:
-    print(json.dumps({"error": "Model file 'city_safety_predictor_model.pkl' not found. Please run train.py first."}))
+    print(json.dumps({"error": f"Model file '{MODEL_PATH}' not found. Please run train.py first."}))
     sys.exit(1)
 except Exception as e:
     print(json.dumps({"error": f"Error loading model: {e}"}))
     sys.exit(1)
 
-def get_age_group(age):
-    if age <= 18: return '0-18'
-    elif age <= 25: return '19-25'
-    elif age <= 35: return '26-35'
-    elif age <= 45: return '36-45'
-    elif age <= 55: return '46-55'
-    elif age <= 65: return '56-65'
-    else: return '65+'
-
-def predict_city_safety_improved(age, gender, year):
-    predictions = []
-
-    # Use a dummy DataFrame for train_features to access .mean() for missing cities
-    # In a real scenario, you'd want to store these means or handle missing cities more robustly
-    dummy_train_features = pd.DataFrame(columns=feature_columns)
-    for col in feature_columns:
-        if col in train_features_stats.columns:
-            dummy_train_features[col] = [train_features_stats.loc['mean', col]]
-        else:
-            dummy_train_features[col] = [0] # Default to 0 if stat not available
-
-    for city in all_cities:
-        try:
-            features = {}
-            features['Victim Age'] = age
-            features['Year'] = year
-
-            features['City'] = label_encoders['City'].transform([city])[0]
-            features['Victim Gender'] = label_encoders['Victim Gender'].transform([gender])[0]
-
-            age_group = get_age_group(age)
-            features['Age_Group'] = label_encoders['Age_Group'].transform([age_group])[0]
-
-            # Use descriptive statistics from training data for city-specific features
-            # This is a simplification; ideally, you'd have pre-calculated city stats
-            # or fetch them from a database. For this script, we'll use overall means
-            # if city-specific historical data isn't readily available in the loaded model.
-            features['Total_Crimes'] = dummy_train_features['Total_Crimes'].mean()
-            features['Avg_Victim_Age'] = dummy_train_features['Avg_Victim_Age'].mean()
-            features['City_Crime_Density'] = dummy_train_features['City_Crime_Density'].mean()
-
-            feature_vector = [features[col] for col in feature_columns if col in features]
-
-            safety_score = float(best_model.predict([feature_vector])[0])
-            safety_score = max(0, min(100, safety_score))
+def predict_city_safety_improved(age, gender, year, k=None):
+    """Ranked city predictions: every city, or only the k safest when k is given"""
+    features = feature_table.fill(age, gender, year)
+    if features is None or not len(feature_table):
+        return []
+    try:
+        scores = np.array(round_scores(clamp_scores(best_model.predict(features))))
+    except Exception as e:
+        # print(f"Error predicting city batch: {e}", file=sys.stderr)
+        return []
 
-            predictions.append({
-                'City': city,
-                'Predicted_Safety_Score': round(safety_score, 2),
-            })
+    # Dicts are only built for the rows returned
+    order = ranked_order(scores) if k is None else top_k(scores, k)
+    return [
+        {
+            'City': feature_table.cities[i],
+            'Predicted_Safety_Score': float(scores[i]),
+            'Safety_Rank': rank,
+        }
+        for rank, i in enumerate(order, start=1)
+    ]
+
+def recommend_locations(age, gender, year, lat, lon, radius_km, n):
+    """Top n locations within radius_km of (lat, lon) by predicted safety score.
+
+    Only the cities of locations inside the radius are scored.
+    """
+    indices, distances = location_index.query(lat, lon, radius_km)
+    city_rows = location_city_rows[indices]
+    scored = city_rows >= 0
+    indices, distances, city_rows = indices[scored], distances[scored], city_rows[scored]
+    if len(indices) == 0:
+        return [], 0
+
+    candidate_rows, location_rows = np.unique(city_rows, return_inverse=True)
+    features = feature_table.fill(age, gender, year, rows=candidate_rows)
+    if features is None:
+        return [], len(indices)
+    scores = np.array(round_scores(clamp_scores(best_model.predict(features))))[location_rows]
+
+    recommendations = []
+    for rank, i in enumerate(top_k(scores, n, tiebreak=distances), start=1):
+        location = indices[i]
+        recommendations.append({
+            'Location_Id': location_index.location_ids[location],
+            'Location_Name': location_index.location_names[location],
+            'City': feature_table.cities[city_rows[i]],
+            'Latitude': float(location_index.latitudes[location]),
+            'Longitude': float(location_index.longitudes[location]),
+            'Distance_Km': round(float(distances[i]), 3),
+            'Predicted_Safety_Score': float(scores[i]),
+            'Safety_Rank': rank,
+        })
+    return recommendations, len(indices)
+
+def run_recommendation(age, gender, year, lat, lon, radius_km, n):
+    """Validate a radius request and build its JSON response.
+
+    Artifacts without location coordinates get the n safest cities instead,
+    under "predictions" with "radius_applied": false.
+    """
+    try:
+        lat, lon, radius_km = float(lat), float(lon), float(radius_km)
+        n = int(n)
+    except (TypeError, ValueError):
+        return {"error": "Invalid lat, lon, radius_km or top_n."}
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or radius_km <= 0 or n <= 0:
+        return {"error": "lat/lon must be valid coordinates and radius_km, top_n positive."}
+
+    if location_index is None:
+        response = run_prediction(age, gender, year, k=n)
+        if 'error' not in response:
+            response['radius_applied'] = False
+        return response
+
+    profile = validate_profile(age, gender, year)
+    if 'error' in profile:
+        return profile
+    try:
+        recommendations, candidates = recommend_locations(
+            profile['age'], profile['gender'], profile['year'], lat, lon, radius_km, n
+        )
+    except Exception as e:
+        return {"error": f"An unexpected error occurred: {e}"}
+    return {
+        "success": True,
+        "recommendations": recommendations,
+        "locations_in_radius": candidates,
+        "radius_applied": True,
+    }
+
+def validate_profile(age, gender, year):
+    """Parsed {age, gender, year}, or {"error": ...}"""
+    try:
+        age = int(age)
+        year = int(year)
+    except (TypeError, ValueError):
+        return {"error": "Invalid age or year. Must be integers."}
+
+    # Basic validation for gender
+    gender = str(gender)
+    if gender.lower() not in ['m', 'f', 'male', 'female']:
+        return {"error": "Invalid gender. Use 'M', 'F', 'male', or 'female'."}
+    return {'age': age, 'gender': 'M' if gender.lower() in ['m', 'male'] else 'F', 'year': year}
+
+def run_prediction(age, gender, year, k=None):
+    """Validate one profile and build the JSON response shared by the CLI and the worker.
+
+    k limits the response to the k safest cities; by default every city is ranked.
+    """
+    profile = validate_profile(age, gender, year)
+    if 'error' in profile:
+        return profile
+    if k is not None:
+        try:
+            k = int(k)
+        except (TypeError, ValueError):
+            k = 0
+        if k <= 0:
+            return {"error": "Invalid top_k. Must be a positive integer."}
 
-        except Exception as e:
-            # print(f"Error predicting for city {city}: {e}", file=sys.stderr)
+    try:
+        results = predict_city_safety_improved(profile['age'], profile['gender'], profile['year'], k)
+    except Exception as e:
+        return {"error": f"An unexpected error occurred: {e}"}
+    return {"success": True, "predictions": results}
+
+def run_worker(stdin=sys.stdin, stdout=sys.stdout):
+    """Serve newline-delimited JSON requests until stdin closes, keeping the model loaded.
+
+    Each request is {"id": ..., "age": ..., "gender": ..., "year": ...}, optionally with
+    "top_k" to return only the k safest cities, or with "lat", "lon", "radius_km" and
+    "top_n" for a radius recommendation; each response is written on its own line
+    with the same "id".
+    """
+    stdout.write(json.dumps({"ready": True, "cities": len(feature_table)}) + "\n")
+    stdout.flush()
+    for line in stdin:
+        if not line.strip():
             continue
-
-    if predictions:
-        results_df = pd.DataFrame(predictions)
-        results_df = results_df.sort_values('Predicted_Safety_Score', ascending=False).reset_index(drop=True)
-        results_df['Safety_Rank'] = results_df.index + 1
-        return results_df.to_dict(orient='records')
-    else:
-        return []
+        request_id = None
+        try:
+            payload = json.loads(line)
+            request_id = payload.get('id')
+            if payload.get('radius_km') is not None:
+                response = run_recommendation(
+                    payload.get('age'), payload.get('gender'), payload.get('year'),
+                    payload.get('lat'), payload.get('lon'), payload.get('radius_km'), payload.get('top_n', 10),
+                )
+            else:
+                response = run_prediction(
+                    payload.get('age'), payload.get('gender'), payload.get('year'), payload.get('top_k')
+                )
+        except (ValueError, AttributeError):
+            response = {"error": "Invalid request. Expected a JSON object with age, gender and year."}
+        response['id'] = request_id
+        stdout.write(json.dumps(response) + "\n")
+        stdout.flush()
+
+def report_startup():
+    """Print import/model-load timings and which heavy libraries got pulled in"""
+    profile = {key: round(value, 4) for key, value in startup_profile.items()}
+    profile['modules_loaded'] = [name for name in ['pandas', 'sklearn', 'xgboost'] if name in sys.modules]
+    print(json.dumps({"startup_profile": profile}), file=sys.stderr)
 
 if __name__ == '__main__':
-    if len(sys.argv) < 4:
-        print(json.dumps({"error": "Usage: python predict_safety.py <age> <gender> <year>"}))
-        sys.exit(1)
+    args = sys.argv[1:]
+    if '--profile-startup' in args:
+        args.remove('--profile-startup')
+        report_startup()
 
-    try:
-        age = int(sys.argv[1])
-        gender = sys.argv[2]
-        year = int(sys.argv[3])
-
-        # Basic validation for gender
-        if gender.lower() not in ['m', 'f', 'male', 'female']:
-            print(json.dumps({"error": "Invalid gender. Use 'M', 'F', 'male', or 'female'."}))
-            sys.exit(1)
-        gender_encoded = 'M' if gender.lower() in ['m', 'male'] else 'F'
-
-        results = predict_city_safety_improved(age, gender_encoded, year)
-        print(json.dumps({"success": True, "predictions": results}))
-    except ValueError:
-        print(json.dumps({"error": "Invalid age or year. Must be integers."}))
+    if args and args[0] == '--worker':
+        run_worker()
+        sys.exit(0)
+
+    if len(args) < 3:
+        print(json.dumps({"error": "Usage: python predict_safety.py [--profile-startup] <age> <gender> <year> | --worker"}))
         sys.exit(1)
-    except Exception as e:
-        print(json.dumps({"error": f"An unexpected error occurred: {e}"}))
+
+    response = run_prediction(args[0], args[1], args[2])
+    print(json.dumps(response))
+    if 'error' in response:
         sys.exit(1)
@@ -0,0 +1,529 @@
+"""
+Shared helpers for the personalized city safety model.
+Compiles the static per-city part of the feature matrix once at artifact load
+so request handlers only fill in the profile columns.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, every process may build
+    fcntl = None
+
+# Age group buckets, in the same order used by train.py
+AGE_GROUP_BOUNDS = [18, 25, 35, 45, 55, 65]
+AGE_GROUP_LABELS = ['0-18', '19-25', '26-35', '36-45', '46-55', '56-65', '65+']
+
+STAT_COLUMNS = ['Total_Crimes', 'Avg_Victim_Age', 'City_Crime_Density']
+
+# Native artifact bundle written by train.py next to the pickled model
+BUNDLE_FORMAT = 'crimesafe-city-safety'
+BUNDLE_FORMAT_VERSION = 1
+BUNDLE_PREFIX = 'city_safety_'
+BUNDLE_MANIFEST = 'manifest.json'
+BUNDLE_BOOSTER = 'booster.ubj'
+BUNDLE_CITY_STATS = 'city_stats.npy'
+BUNDLE_LOCATIONS = 'locations.npy'
+
+# Radius queries over location_stats coordinates
+EARTH_RADIUS_KM = 6371.0088
+LOCATION_CELL_DEGREES = 0.5  # grid cell edge, about 55 km of latitude
+
+# Every profile the /predict endpoint accepts
+GRID_AGES = range(0, 101)
+GRID_GENDERS = ['M', 'F']
+GRID_YEARS = range(2020, 2031)
+
+
+def get_age_group(age):
+    for bound, label in zip(AGE_GROUP_BOUNDS, AGE_GROUP_LABELS):
+        if age <= bound:
+            return label
+    return AGE_GROUP_LABELS[-1]
+
+
+def clamp_scores(raw_scores):
+    """Clamp model output to the 0-100 safety score range"""
+    return np.clip(np.asarray(raw_scores, dtype=np.float64), 0, 100)
+
+
+def round_scores(scores):
+    """Round to 2 decimals exactly as the per-city loop used to (Python round, not np.round)"""
+    return [round(float(score), 2) for score in scores]
+
+
+def shared_array(path, build):
+    """Memory-map the .npy at path, building and publishing it first if no process has yet.
+
+    Files are written under a temporary name and renamed into place, so readers
+    never see a partial array and every process maps the same physical pages.
+    """
+    if not os.path.exists(path):
+        array = build()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(array))
+        os.replace(tmp_path, path)
+    return np.load(path, mmap_mode='r')
+
+
+@contextmanager
+def directory_lock(directory, name):
+    """Exclusive lock on directory/name.lock across processes, held for the with block"""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, f'{name}.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def shared_dir(root, fingerprint):
+    """Per-artifact directory under root for shared arrays, keyed on the artifact fingerprint"""
+    key = hashlib.sha1(repr(fingerprint).encode()).hexdigest()[:16]
+    directory = os.path.join(root, key)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def city_stats_array(city_stats, all_cities):
+    """{stat: {city: value}} as an (all_cities x STAT_COLUMNS) array, NaN where a city has no value"""
+    city_stats = city_stats or {}
+    return np.array(
+        [[city_stats.get(stat, {}).get(city, np.nan) for stat in STAT_COLUMNS] for city in all_cities],
+        dtype=np.float64,
+    ).reshape(len(all_cities), len(STAT_COLUMNS))
+
+
+def training_means(train_features_stats, feature_columns):
+    """Read the training mean of each feature column from a describe() frame"""
+    means = {}
+    if train_features_stats is None:
+        return means
+    for col in feature_columns:
+        if col in train_features_stats.columns:
+            means[col] = float(train_features_stats.loc['mean', col])
+    return means
+
+
+class BoosterModel:
+    """predict() over a native xgboost Booster, matching XGBRegressor.predict"""
+
+    def __init__(self, booster, best_iteration=None):
+        self.booster = booster
+        self.best_iteration = best_iteration
+
+    def predict(self, features):
+        iteration_range = (0, 0)
+        if self.best_iteration is not None:
+            iteration_range = (0, self.best_iteration + 1)
+        return self.booster.inplace_predict(features, iteration_range=iteration_range)
+
+    def __repr__(self):
+        return f"BoosterModel(trees={self.booster.num_boosted_rounds()}, best_iteration={self.best_iteration})"
+
+
+def save_bundle(bundle_dir, model_data, model_version):
+    """Write model_data (the dict train.py pickles) as a native bundle directory.
+
+    The booster goes out in XGBoost's UBJSON format, the label encoders as their
+    vocabularies and the per-city stats as an .npy aligned with all_cities.
+    The directory is written next to its final path and renamed into place.
+    """
+    bundle_dir = os.path.abspath(bundle_dir)
+    tmp_dir = bundle_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    model = model_data['model']
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    booster.save_model(os.path.join(tmp_dir, BUNDLE_BOOSTER))
+
+    all_cities = list(model_data.get('all_cities', []))
+    manifest_columns = list(model_data.get('feature_columns', []))
+    np.save(os.path.join(tmp_dir, BUNDLE_CITY_STATS), city_stats_array(model_data.get('city_stats'), all_cities))
+
+    train_feature_means = model_data.get('train_feature_means')
+    if train_feature_means is None:
+        train_feature_means = training_means(model_data.get('train_features_stats'), manifest_columns)
+
+    # Locations are stored in grid cell order, so loading the index needs no re-sort
+    locations = None
+    if model_data.get('locations'):
+        index = LocationIndex(model_data['locations'])
+        np.save(os.path.join(tmp_dir, BUNDLE_LOCATIONS), np.column_stack([index.latitudes, index.longitudes]))
+        locations = {
+            'coordinates': BUNDLE_LOCATIONS,
+            'cell_degrees': index.cell_degrees,
+            'location_id': index.location_ids,
+            'location_name': index.location_names,
+            'city': index.location_cities,
+        }
+
+    try:
+        best_iteration = int(model.best_iteration)
+    except (AttributeError, TypeError):
+        best_iteration = None
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'model_version': model_version,
+        'created_at': datetime.now().isoformat(),
+        'booster': BUNDLE_BOOSTER,
+        'best_iteration': best_iteration,
+        'feature_columns': manifest_columns,
+        'all_cities': all_cities,
+        'label_encoders': {
+            column: [str(label) for label in getattr(encoder, 'classes_', encoder)]
+            for column, encoder in (model_data.get('label_encoders') or {}).items()
+        },
+        'city_stats': BUNDLE_CITY_STATS,
+        'stat_columns': STAT_COLUMNS,
+        'train_feature_means': train_feature_means,
+        'locations': locations,
+    }
+    with open(os.path.join(tmp_dir, BUNDLE_MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.exists(bundle_dir):
+        shutil.rmtree(bundle_dir)
+    os.rename(tmp_dir, bundle_dir)
+    return bundle_dir
+
+
+def find_latest_bundle(models_dir):
+    """Newest bundle directory under models_dir (versions sort by timestamp), or None"""
+    if not os.path.isdir(models_dir):
+        return None
+    bundles = [
+        os.path.join(models_dir, name) for name in os.listdir(models_dir)
+        if name.startswith(BUNDLE_PREFIX) and not name.endswith('.tmp')
+        and os.path.isfile(os.path.join(models_dir, name, BUNDLE_MANIFEST))
+    ]
+    return max(bundles) if bundles else None
+
+
+def load_bundle(bundle_dir, mmap=True):
+    """Load a bundle into the same dict shape as the pickled model artifacts"""
+    import xgboost as xgb
+
+    with open(os.path.join(bundle_dir, BUNDLE_MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != BUNDLE_FORMAT or manifest.get('format_version') != BUNDLE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported bundle format in {bundle_dir}")
+
+    booster = xgb.Booster()
+    booster.load_model(os.path.join(bundle_dir, manifest['booster']))
+
+    # Per-city stats stay a (memory-mapped) array; CityFeatureTable reads it column by column
+    city_stats = np.load(os.path.join(bundle_dir, manifest['city_stats']), mmap_mode='r' if mmap else None)
+
+    locations = None
+    if manifest.get('locations'):
+        coordinates = np.load(os.path.join(bundle_dir, manifest['locations']['coordinates']),
+                              mmap_mode='r' if mmap else None)
+        locations = {
+            'location_id': manifest['locations']['location_id'],
+            'location_name': manifest['locations']['location_name'],
+            'city': manifest['locations']['city'],
+            'latitude': coordinates[:, 0],
+            'longitude': coordinates[:, 1],
+        }
+
+    return {
+        'model': BoosterModel(booster, manifest.get('best_iteration')),
+        'label_encoders': manifest['label_encoders'],
+        'feature_columns': manifest['feature_columns'],
+        'all_cities': manifest['all_cities'],
+        'city_stats': city_stats,
+        'stat_columns': manifest['stat_columns'],
+        'train_feature_means': manifest.get('train_feature_means', {}),
+        'model_version': manifest.get('model_version'),
+        'locations': locations,
+    }
+
+
+class CityFeatureTable:
+    """Dense feature matrix with one row per encodable city, in feature_columns order.
+
+    city_stats is {stat: {city: value}} as pickled by train.py or, from a bundle,
+    an array with one row per all_cities entry and one column per stat_columns
+    entry, NaN where a city has no value.
+    """
+
+    def __init__(self, label_encoders, feature_columns, all_cities, city_stats=None, column_defaults=None,
+                 stat_columns=STAT_COLUMNS):
+        self.label_encoders = label_encoders or {}
+        column_defaults = column_defaults or {}
+        if not isinstance(city_stats, np.ndarray):
+            city_stats, stat_columns = city_stats_array(city_stats, all_cities), STAT_COLUMNS
+
+        # Label -> code lookups replace per-request LabelEncoder.transform calls
+        # Encoders are fitted LabelEncoders or, from a bundle, plain vocabulary lists
+        self.encoder_codes = {
+            column: {label: code for code, label in enumerate(getattr(encoder, 'classes_', encoder))}
+            for column, encoder in self.label_encoders.items()
+            if encoder is not None
+        }
+
+        if feature_columns:
+            self.feature_columns = list(feature_columns)
+        else:
+            # Fallback order used by app.py when no feature_columns were saved
+            self.feature_columns = ['Victim Age', 'Year']
+            for col in ['City', 'Victim Gender', 'Age_Group']:
+                if self.label_encoders.get(col):
+                    self.feature_columns.append(col)
+            self.feature_columns += STAT_COLUMNS
+        self.column_index = {col: i for i, col in enumerate(self.feature_columns)}
+
+        self.cities = []
+        self.skipped_cities = []
+        kept = []
+        city_codes = []
+        for i, city in enumerate(all_cities):
+            if self.label_encoders.get('City'):
+                city_code = self.encode('City', city)
+                if city_code is None:
+                    self.skipped_cities.append(city)
+                    continue
+                city_codes.append(city_code)
+            self.cities.append(city)
+            kept.append(i)
+
+        defaults = np.array([column_defaults.get(col, 0) for col in self.feature_columns], dtype=np.float64)
+        self.matrix = np.tile(defaults, (len(kept), 1))
+        if city_codes and 'City' in self.column_index:
+            self.matrix[:, self.column_index['City']] = city_codes
+        for i, stat in enumerate(stat_columns):
+            if stat in self.column_index:
+                values = np.asarray(city_stats[kept, i], dtype=np.float64)
+                column = self.column_index[stat]
+                self.matrix[:, column] = np.where(np.isnan(values), self.matrix[:, column], values)
+
+    def __len__(self):
+        return len(self.cities)
+
+    def share(self, directory):
+        """Swap the city matrix for a memory-mapped copy shared with other workers"""
+        matrix = self.matrix
+        self.matrix = shared_array(os.path.join(directory, 'city_matrix.npy'), lambda: matrix)
+
+    def encode(self, column, value):
+        """Encode a categorical value, or None if it was never seen in training"""
+        return self.encoder_codes.get(column, {}).get(value)
+
+    def request_values(self, age, gender, year):
+        """Per-request column values, or None if gender/age group cannot be encoded"""
+        values = {'Victim Age': age, 'Year': year}
+        for column, label in [('Victim Gender', gender), ('Age_Group', get_age_group(age))]:
+            if self.label_encoders.get(column):
+                code = self.encode(column, label)
+                if code is None:
+                    return None
+                values[column] = code
+        return values
+
+    def fill(self, age, gender, year, rows=None):
+        """Return a copy of the city matrix (or of the given rows) with the profile columns filled in"""
+        values = self.request_values(age, gender, year)
+        if values is None:
+            return None
+        features = np.array(self.matrix if rows is None else self.matrix[rows], dtype=np.float64)
+        for column, value in values.items():
+            if column in self.column_index:
+                features[:, self.column_index[column]] = value
+        return features
+
+
+class LocationIndex:
+    """Locations bucketed into a fixed lat/lon grid for radius queries.
+
+    locations maps location_id, location_name, city, latitude and longitude to
+    equal-length sequences. Points are kept sorted by grid cell, so a query reads
+    one or two contiguous slices per grid row of the radius' bounding box and
+    computes exact haversine distances only for those candidates.
+    """
+
+    def __init__(self, locations, cell_degrees=LOCATION_CELL_DEGREES):
+        self.cell_degrees = float(cell_degrees)
+        self.n_cols = int(np.ceil(360 / self.cell_degrees))
+        latitudes = np.asarray(locations['latitude'], dtype=np.float64)
+        longitudes = np.asarray(locations['longitude'], dtype=np.float64)
+        keys = self._row(latitudes) * self.n_cols + self._col(longitudes)
+
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.latitudes = latitudes[order]
+        self.longitudes = longitudes[order]
+        self.location_ids = [str(locations['location_id'][i]) for i in order]
+        self.location_names = [str(locations['location_name'][i]) for i in order]
+        self.location_cities = [str(locations['city'][i]) for i in order]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _row(self, latitudes):
+        rows = np.floor((np.asarray(latitudes) + 90) / self.cell_degrees).astype(np.int64)
+        return np.clip(rows, 0, int(np.ceil(180 / self.cell_degrees)) - 1)
+
+    def _col(self, longitudes):
+        return np.floor((np.asarray(longitudes) + 180) % 360 / self.cell_degrees).astype(np.int64) % self.n_cols
+
+    def city_rows(self, cities):
+        """Row of each location's city in cities (case-insensitive), -1 if the model has no such city"""
+        rows = {str(city).strip().upper(): i for i, city in enumerate(cities)}
+        return np.array([rows.get(city.strip().upper(), -1) for city in self.location_cities], dtype=np.int64)
+
+    def _candidates(self, lat, lon, radius_km):
+        """Indices of every point in grid cells overlapping the radius' bounding box"""
+        dlat = np.degrees(radius_km / EARTH_RADIUS_KM)
+        lat_min, lat_max = lat - dlat, lat + dlat
+        if lat_min <= -90 or lat_max >= 90:
+            return np.arange(len(self))  # the circle covers a pole
+        dlon = dlat / np.cos(np.radians(max(abs(lat_min), abs(lat_max))))
+        if dlon >= 180:
+            return np.arange(len(self))
+
+        col_min, col_max = int(self._col(lon - dlon)), int(self._col(lon + dlon))
+        col_ranges = [(col_min, col_max)] if col_min <= col_max else [(col_min, self.n_cols - 1), (0, col_max)]
+        slices = []
+        for row in range(int(self._row(lat_min)), int(self._row(lat_max)) + 1):
+            for first, last in col_ranges:
+                start = np.searchsorted(self.keys, row * self.n_cols + first, side='left')
+                stop = np.searchsorted(self.keys, row * self.n_cols + last, side='right')
+                if stop > start:
+                    slices.append(np.arange(start, stop))
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+    def query(self, lat, lon, radius_km):
+        """(indices, distances in km) of the locations within radius_km of (lat, lon)"""
+        candidates = self._candidates(float(lat), float(lon), float(radius_km))
+        lat1, lon1 = np.radians(lat), np.radians(lon)
+        lat2, lon2 = np.radians(self.latitudes[candidates]), np.radians(self.longitudes[candidates])
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        within = distances <= radius_km
+        return candidates[within], distances[within]
+
+
+def top_k(scores, k, tiebreak=None):
+    """Indices of the k highest scores, best first; equal scores are ordered by
+    ascending tiebreak (default: index, i.e. the order of a stable descending sort).
+
+    np.partition finds the k-th best score in linear time, so only the rows
+    scoring at least that much get sorted. top_k(-scores, k, -np.arange(n))
+    gives the k lowest in the order a stable descending sort lists them reversed.
+    """
+    scores = np.asarray(scores)
+    tiebreak = np.arange(len(scores)) if tiebreak is None else np.asarray(tiebreak)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        cutoff = -np.partition(-scores, k - 1)[k - 1]
+        kept = np.flatnonzero(scores >= cutoff)
+    else:
+        kept = np.arange(len(scores))
+    return kept[np.lexsort((tiebreak[kept], -scores[kept]))][:k]
+
+
+def ranked_order(scores):
+    """Every index, best score first, ties in index order"""
+    return np.argsort(-np.asarray(scores), kind='stable')
+
+
+class ScoreGrid:
+    """Ranked scores for every (age, gender, year) profile, scored once per model load"""
+
+    ARRAYS = ('scores', 'order', 'valid')
+
+    def __init__(self, feature_table, model, ages=GRID_AGES, genders=GRID_GENDERS, years=GRID_YEARS):
+        self._set_axes(feature_table, ages, genders, years)
+
+        shape = (len(ages), len(genders), len(years))
+        n_cities = len(self.cities)
+        self.valid = np.zeros(shape, dtype=bool)
+        self.scores = np.zeros(shape + (n_cities,), dtype=np.float64)
+        self.order = np.zeros(shape + (n_cities,), dtype=np.int32)
+        if n_cities == 0:
+            return
+
+        # One predict call per (gender, year) block covering every age
+        for g, gender in enumerate(genders):
+            for y, year in enumerate(years):
+                blocks = []
+                age_indices = []
+                for a, age in enumerate(ages):
+                    features = feature_table.fill(age, gender, year)
+                    if features is not None:
+                        blocks.append(features)
+                        age_indices.append(a)
+                if not blocks:
+                    continue
+
+                raw = clamp_scores(model.predict(np.vstack(blocks))).reshape(len(blocks), n_cities)
+                rounded = np.array([round_scores(row) for row in raw], dtype=np.float64)
+                # Stable descending sort, same tie order as list.sort(reverse=True)
+                order = np.argsort(-rounded, axis=1, kind='stable')
+                self.scores[age_indices, g, y] = np.take_along_axis(rounded, order, axis=1)
+                self.order[age_indices, g, y] = order
+                self.valid[age_indices, g, y] = True
+
+    def _set_axes(self, feature_table, ages, genders, years):
+        self.cities = list(feature_table.cities)
+        self.ages = ages
+        self.gender_index = {gender: i for i, gender in enumerate(genders)}
+        self.years = years
+
+    @classmethod
+    def shared(cls, feature_table, model, directory, ages=GRID_AGES, genders=GRID_GENDERS, years=GRID_YEARS):
+        """Memory-map a grid published under directory, scoring and publishing it if it is missing.
+
+        Only one process scores it: the others wait on the directory's lock file,
+        then map what it published.
+        """
+        paths = {name: os.path.join(directory, f'grid_{name}.npy') for name in cls.ARRAYS}
+        grid = cls.__new__(cls)
+        grid._set_axes(feature_table, ages, genders, years)
+        with directory_lock(directory, 'grid'):
+            built = None
+            if not all(os.path.exists(path) for path in paths.values()):
+                built = cls(feature_table, model, ages, genders, years)
+            for name, path in paths.items():
+                setattr(grid, name, shared_array(path, lambda name=name: getattr(built, name)))
+        return grid
+
+    def __len__(self):
+        return int(np.prod(self.valid.shape))
+
+    def _index(self, values, value):
+        if isinstance(value, bool) or float(value) != int(value):
+            return None
+        offset = int(value) - values.start
+        if 0 <= offset < len(values):
+            return offset
+        return None
+
+    def lookup(self, age, gender, year):
+        """Ranked (cities, scores) for a profile, or None if it is outside the grid"""
+        a = self._index(self.ages, age)
+        y = self._index(self.years, year)
+        g = self.gender_index.get(gender)
+        if a is None or y is None or g is None:
+            return None
+        if not self.valid[a, g, y]:
+            return [], []
+        order = self.order[a, g, y]
+        return [self.cities[i] for i in order], self.scores[a, g, y].tolist()
@@ -4,16 +4,28 @@ Trains time-series forecasting models on 2020-2023 data, tests on 2024
 """
 
 import pandas as pd
+from pandas.api.types import union_categoricals
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+try:
+    import pyarrow.csv as pa_csv  # enables pd.read_csv(engine="pyarrow")
+except ImportError:
+    pa_csv = None
 import numpy as np
 from datetime import datetime
 import joblib
 import json
+import multiprocessing
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # ML libraries
 from sklearn.model_selection import TimeSeriesSplit
-from sklearn.metrics import mean_squared_error, mean_absolute_error, accuracy_score, confusion_matrix
+from sklearn.metrics import mean_squared_error, mean_absolute_error
 from sklearn.preprocessing import StandardScaler
 import xgboost as xgb
 from sklearn.preprocessing import LabelEncoder
@@ -27,17 +39,14 @@ except ImportError:
     print("Prophet not installed, skipping Prophet model")
     Prophet = None
 
-# Explainability
-try:
-    import shap
-except ImportError:
-    print("SHAP not installed, skipping explainability")
-    shap = None
-
 # Database connection
 import os
 import psycopg2
 
+from safety_model import BUNDLE_PREFIX, STAT_COLUMNS, save_bundle
+from training_cache import TrainingDataCache
+from zone_forecast import RecursiveForecaster, latest_history, write_predictions
+
 # Configuration
 TRAIN_YEARS = [2020, 2021, 2022, 2023]
 TEST_YEAR = 2024
@@ -45,6 +54,308 @@ MODEL_VERSION = f"v1_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
 MODEL_DIR = Path("models")
 MODEL_DIR.mkdir(exist_ok=True)
 
+# Training scheduler: the time-series and personalized safety models share no data,
+# so run_training_pipeline trains them in separate processes
+TRAINING_WORKERS = int(os.environ.get("TRAINING_WORKERS", 2))  # 1 = train branches one after another
+TRAINING_CPUS = int(os.environ.get("TRAINING_CPUS", os.cpu_count() or 1))
+# Share of TRAINING_CPUS given to each branch as XGBoost n_jobs (the time-series
+# branch fits on more rows)
+BRANCH_CPU_WEIGHTS = {'time_series': 2, 'personalized_safety': 1}
+
+# Time-series XGBoost settings
+TIME_SERIES_XGB_PARAMS = {
+    'n_estimators': 200,
+    'max_depth': 6,
+    'learning_rate': 0.1,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+    'random_state': 42,
+}
+# Training profile: 'default' fits a fixed number of estimators; 'fast' builds a quantized
+# (hist) DMatrix once and early-stops on a validation split taken from the training years
+TRAINING_PROFILE = os.environ.get("TRAINING_PROFILE", "default")
+FAST_MAX_ROUNDS = int(os.environ.get("FAST_MAX_ROUNDS", 1000))  # upper bound, early stopping picks the count
+FAST_MAX_BIN = int(os.environ.get("FAST_MAX_BIN", 256))
+EARLY_STOPPING_ROUNDS = int(os.environ.get("EARLY_STOPPING_ROUNDS", 20))
+VALIDATION_MONTHS = int(os.environ.get("VALIDATION_MONTHS", 6))  # time-series: last N training months
+SAFETY_VALIDATION_FRACTION = float(os.environ.get("SAFETY_VALIDATION_FRACTION", 0.1))  # safety model: random holdout
+# Zone thresholds on monthly crime counts: above RED is red, above AMBER is amber, else green
+ZONE_LABELS = ['green', 'amber', 'red']  # index = zone code
+AMBER_THRESHOLD = float(os.environ.get("AMBER_THRESHOLD", 20))
+RED_THRESHOLD = float(os.environ.get("RED_THRESHOLD", 50))
+# Batch zone-forecast export to the predictions table
+PREDICTION_EXPORT = os.environ.get("PREDICTION_EXPORT", "0") == "1"
+FORECAST_HORIZON_MONTHS = int(os.environ.get("FORECAST_HORIZON_MONTHS", 12))
+EXPORT_METHOD = os.environ.get("EXPORT_METHOD", "copy")  # copy | values (execute_values)
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 5000))
+# Incremental retraining: continue the latest models/xgboost_<version>.joblib on new months only
+INCREMENTAL_TRAINING = os.environ.get("INCREMENTAL_TRAINING", "0") == "1"
+INCREMENTAL_ROUNDS = int(os.environ.get("INCREMENTAL_ROUNDS", 50))  # boosting rounds added per refresh
+INCREMENTAL_TOLERANCE = float(os.environ.get("INCREMENTAL_TOLERANCE", 0.02))  # allowed relative test RMSE regression
+
+# Streaming loader settings
+LOAD_BATCH_SIZE = int(os.environ.get("LOAD_BATCH_SIZE", 50000))
+SPLIT_IN_SQL = os.environ.get("SPLIT_IN_SQL", "0") == "1"  # query train and test years separately
+
+# Local Parquet cache of training inputs, refreshed per (year, month) partition
+TRAINING_CACHE = os.environ.get("TRAINING_CACHE", "0") == "1"
+TRAINING_CACHE_DIR = Path(os.environ.get("TRAINING_CACHE_DIR", "cache/training"))
+
+# Per-partition and location_stats content hashes, used as cache watermarks
+MONTHLY_WATERMARK_QUERY = """
+SELECT ma.year, ma.month, md5(string_agg(ma::text, '|' ORDER BY ma.location_id))
+FROM monthly_aggregations ma
+GROUP BY ma.year, ma.month
+"""
+LOCATION_STATS_WATERMARK_QUERY = """
+SELECT md5(coalesce(string_agg(
+    (ls.location_id, ls.latitude, ls.longitude, ls.population)::text, '|' ORDER BY ls.location_id
+), ''))
+FROM location_stats ls
+"""
+
+# Coordinates behind the personalized model's radius index (safety_model.LocationIndex)
+LOCATION_COORDINATES_QUERY = """
+SELECT location_id, location_name, city, latitude, longitude
+FROM location_stats
+WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+ORDER BY location_id
+"""
+
+# Compact dtypes for monthly_aggregations rows; nullable columns stay float
+MONTHLY_DTYPES = {
+    'year': 'int16',
+    'month': 'int8',
+    'crime_count': 'int32',
+    'male_victims': 'int32',
+    'female_victims': 'int32',
+    'crime_rate': 'float32',
+    'avg_victim_age': 'float32',
+    'latitude': 'float32',
+    'longitude': 'float32',
+    'population': 'float32',
+}
+
+def compact_monthly_frame(df):
+    """Downcast one batch of monthly aggregation rows"""
+    for col, dtype in MONTHLY_DTYPES.items():
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col]).astype(dtype)
+    if 'location_id' in df.columns:
+        df['location_id'] = df['location_id'].astype('category')
+    return df
+
+def concat_monthly_chunks(chunks, columns):
+    """Concatenate batches, merging their location_id categories instead of falling back to object"""
+    if not chunks:
+        return compact_monthly_frame(pd.DataFrame(columns=columns))
+    if 'location_id' not in chunks[0].columns:
+        return pd.concat(chunks, ignore_index=True)
+    location_ids = union_categoricals([chunk.pop('location_id') for chunk in chunks], sort_categories=True)
+    df = pd.concat(chunks, ignore_index=True)
+    df.insert(columns.index('location_id'), 'location_id', location_ids)
+    return df
+
+# Raw crime CSV schema (crime_dataset_india.csv). Only these columns are read;
+# integer columns are read as float64 (NaN-safe, fast to parse) and become int64
+# once dropna() has run,
+# low-cardinality text is read straight into categoricals.
+RAW_CRIME_SCHEMA = {
+    'Report Number': 'float64',
+    'Date Reported': str,
+    'Date of Occurrence': str,
+    'Time of Occurrence': str,
+    'City': 'category',
+    'Crime Code': 'float64',
+    'Crime Description': 'category',
+    'Victim Age': 'float64',
+    'Victim Gender': 'category',
+    'Weapon Used': 'category',
+    'Crime Domain': 'category',
+    'Police Deployed': 'float64',
+    'Case Closed': 'category',
+    'Date Case Closed': str,
+}
+RAW_CSV_ENGINE = os.environ.get("RAW_CSV_ENGINE", "pyarrow" if pa_csv is not None else "c")
+# strftime format of the date columns; inferred once from the first value when unset
+RAW_CSV_DATE_FORMAT = os.environ.get("RAW_CSV_DATE_FORMAT")
+
+def read_raw_crime_csv(csv_path, engine=RAW_CSV_ENGINE):
+    """Read the schema columns of the raw crime CSV with explicit dtypes"""
+    header = pd.read_csv(csv_path, nrows=0).columns
+    usecols = [col for col in header if col in RAW_CRIME_SCHEMA]
+    dtype = {col: RAW_CRIME_SCHEMA[col] for col in usecols}
+    return pd.read_csv(csv_path, usecols=usecols, dtype=dtype, engine=engine)
+
+def parse_dates(values, date_format=RAW_CSV_DATE_FORMAT):
+    """Parse a date column with one fixed format instead of per-value inference"""
+    if date_format is None:
+        first = values.dropna()
+        date_format = guess_datetime_format(str(first.iloc[0])) if len(first) else None
+    return pd.to_datetime(values, format=date_format, errors='coerce')
+
+def normalize_categorical(values):
+    """strip().title() each distinct value once and map the results back onto the rows"""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    normalized = pd.Index(uniques).astype(str).str.strip().str.title()
+    return pd.Series(normalized.take(codes), index=values.index).astype(str)
+
+def clean_raw_crime_data(df):
+    """Drop incomplete/duplicate rows, parse dates and normalize categoricals for the safety model"""
+    df_clean = df.dropna()
+    df_clean = df_clean.drop_duplicates()
+
+    # No missing values are left, so integer columns can be plain int64 again
+    for col, dtype in RAW_CRIME_SCHEMA.items():
+        if dtype == 'float64' and col in df_clean.columns and (df_clean[col] % 1 == 0).all():
+            df_clean[col] = df_clean[col].astype('int64')
+
+    date_columns = ['Date Reported', 'Date of Occurrence']
+    for col in date_columns:
+        if col in df_clean.columns:
+            df_clean[col] = parse_dates(df_clean[col])
+    
+    categorical_columns = ['City', 'Crime Description', 'Victim Gender', 'Weapon Used', 'Crime Domain']
+    for col in categorical_columns:
+        if col in df_clean.columns:
+            df_clean[col] = normalize_categorical(df_clean[col])
+
+    if 'Victim Age' in df_clean.columns:
+        df_clean['Victim Age'] = pd.to_numeric(df_clean['Victim Age'], errors='coerce')
+        df_clean = df_clean[df_clean['Victim Age'].between(0, 100)]
+    
+    if 'Date of Occurrence' in df_clean.columns:
+        df_clean['Year'] = df_clean['Date of Occurrence'].dt.year
+    
+    return df_clean
+
+def add_location_features(df):
+    """Add per-location lag, rolling and trend features in one grouped pass.
+
+    Expects df sorted by location_id, year, month. Matches the old per-location
+    loop exactly: rows without a location_id are dropped and the result gets a
+    fresh RangeIndex in sorted order.
+    """
+    df = df[df['location_id'].notna()].reset_index(drop=True)
+    counts = df.groupby('location_id', sort=False, observed=True)['crime_count']
+
+    # Lag features (1, 3, 6, 12 months)
+    for lag in [1, 3, 6, 12]:
+        df[f'lag_{lag}'] = counts.shift(lag)
+
+    # Rolling statistics (windows never cross location boundaries)
+    def rolling(window, stat):
+        values = getattr(counts.rolling(window=window, min_periods=1), stat)()
+        return values.reset_index(level=0, drop=True)
+
+    df['rolling_mean_3'] = rolling(3, 'mean')
+    df['rolling_std_3'] = rolling(3, 'std')
+    df['rolling_mean_6'] = rolling(6, 'mean')
+
+    # Trend (linear)
+    df['trend'] = counts.cumcount()
+
+    return df
+
+def month_key(df):
+    """year * 100 + month, for comparing monthly rows against a training watermark"""
+    return df['year'].astype(int) * 100 + df['month'].astype(int)
+
+def zone_codes(counts, amber_threshold=AMBER_THRESHOLD, red_threshold=RED_THRESHOLD):
+    """Map crime counts to zone codes (0 green, 1 amber, 2 red) in one vectorized pass"""
+    counts = np.asarray(counts, dtype=np.float64)
+    if np.isnan(counts).any():
+        raise ValueError("Cannot classify NaN crime counts into zones")
+    # right=True: a count equal to a threshold stays in the lower zone, as with `count > threshold`
+    return np.digitize(counts, [amber_threshold, red_threshold], right=True).astype(np.int8)
+
+def zone_confusion_matrix(true_codes, pred_codes, n_zones=len(ZONE_LABELS)):
+    """Confusion matrix (rows actual, columns predicted) from integer zone codes"""
+    pairs = true_codes.astype(np.int64) * n_zones + pred_codes
+    return np.bincount(pairs, minlength=n_zones * n_zones).reshape(n_zones, n_zones)
+
+def fit_quantized(params, X_train, y_train, X_val, y_val, n_jobs=-1):
+    """Fit an XGBRegressor with tree_method='hist' on a quantized DMatrix, early-stopping on X_val.
+
+    The training QuantileDMatrix is built once and its bin cuts are reused for the
+    validation matrix. params are XGBRegressor keyword arguments; n_estimators is
+    replaced by FAST_MAX_ROUNDS. Returns the regressor, trimmed to its best
+    iteration, and a report of rounds used against wall time.
+    """
+    start = time.perf_counter()
+    dtrain = xgb.QuantileDMatrix(X_train, y_train, max_bin=FAST_MAX_BIN, nthread=n_jobs)
+    dval = xgb.QuantileDMatrix(X_val, y_val, ref=dtrain, max_bin=FAST_MAX_BIN, nthread=n_jobs)
+    quantize_seconds = time.perf_counter() - start
+
+    booster_params = {key: value for key, value in params.items() if key not in ('n_estimators', 'random_state')}
+    booster_params.update({
+        'objective': 'reg:squarederror',
+        'tree_method': 'hist',
+        'max_bin': FAST_MAX_BIN,
+        'nthread': n_jobs,
+        'seed': params.get('random_state', 0),
+    })
+    booster = xgb.train(
+        booster_params, dtrain,
+        num_boost_round=FAST_MAX_ROUNDS,
+        evals=[(dval, 'validation')],
+        early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+        verbose_eval=False,
+    )
+    rounds = booster.best_iteration + 1
+    best_validation_rmse = float(booster.best_score)
+    booster = booster[:rounds]  # drop the rounds past the best one
+
+    # Wrap in the sklearn estimator so predict/feature_importances_/xgb_model continuation work unchanged
+    model = xgb.XGBRegressor(**{**params, 'n_estimators': rounds}, tree_method='hist', max_bin=FAST_MAX_BIN, n_jobs=n_jobs)
+    model.load_model(bytearray(booster.save_raw()))
+
+    report = {
+        'profile': 'fast',
+        'rounds': rounds,
+        'max_rounds': FAST_MAX_ROUNDS,
+        'best_validation_rmse': best_validation_rmse,
+        'quantize_seconds': round(quantize_seconds, 3),
+        'seconds': round(time.perf_counter() - start, 3),
+        'train_rows': int(len(y_train)),
+        'validation_rows': int(len(y_val)),
+    }
+    print(f"Early stopping: {rounds}/{FAST_MAX_ROUNDS} rounds in {report['seconds']:.2f}s "
+          f"(quantize {quantize_seconds:.2f}s, validation RMSE {report['best_validation_rmse']:.2f}, "
+          f"{report['train_rows']} train / {report['validation_rows']} validation rows)")
+    return model, report
+
+def fit_default(params, X_train, y_train, n_jobs=-1, **fit_kwargs):
+    """Fit an XGBRegressor with a fixed number of estimators, reporting rounds against wall time"""
+    start = time.perf_counter()
+    model = xgb.XGBRegressor(**params, n_jobs=n_jobs)
+    model.fit(X_train, y_train, **fit_kwargs)
+    report = {
+        'profile': 'default',
+        'rounds': model.get_booster().num_boosted_rounds(),
+        'seconds': round(time.perf_counter() - start, 3),
+        'train_rows': int(len(y_train)),
+    }
+    print(f"Fixed rounds: {report['rounds']} rounds in {report['seconds']:.2f}s ({report['train_rows']} train rows)")
+    return model, report
+
+def cpu_budgets(branches, total_cpus=TRAINING_CPUS, weights=BRANCH_CPU_WEIGHTS):
+    """Split total_cpus between branches by weight, at least one CPU each.
+
+    Used as XGBoost n_jobs per branch so concurrent fits don't oversubscribe the machine.
+    """
+    total_weight = sum(weights.get(branch, 1) for branch in branches)
+    budgets = {
+        branch: max(1, total_cpus * weights.get(branch, 1) // total_weight)
+        for branch in branches
+    }
+    # Hand CPUs lost to rounding down to the heaviest branch
+    spare = total_cpus - sum(budgets.values())
+    if spare > 0:
+        heaviest = max(branches, key=lambda branch: weights.get(branch, 1))
+        budgets[heaviest] += spare
+    return budgets
+
 class CrimeSafeTrainer:
     def __init__(self):
         self.db_url = os.environ.get("DATABASE_URL")
@@ -52,17 +363,30 @@ class CrimeSafeTrainer:
             raise ValueError("DATABASE_URL environment variable not set")
         self.models = {}
         self.scalers = {}
+        
+        self.data_cache = None
+        if TRAINING_CACHE:
+            try:
+                self.data_cache = TrainingDataCache(TRAINING_CACHE_DIR)
+            except ImportError as e:
+                print(f"{e}, training data cache disabled")
         self.feature_names = [] # For the time-series model
         
         # For personalized safety model
         self.safety_label_encoders = {}
         self.safety_feature_columns = []
         self.all_cities = []
-        self.train_features_stats = None
+        self.train_feature_means = {}
+        self.city_stats = {}
         self.best_safety_model = None
 
-    def load_data(self):
-        """Load data from database"""
+    def load_data(self, years=None):
+        """Stream monthly aggregations from the database in batches with compact dtypes.
+
+        Uses a server-side cursor so rows arrive LOAD_BATCH_SIZE at a time. When
+        years is given the filter runs in SQL and other years are never fetched.
+        With TRAINING_CACHE=1 only changed (year, month) partitions are fetched.
+        """
         print("Loading data from database...")
         conn = psycopg2.connect(self.db_url)
         
@@ -75,24 +399,95 @@ class CrimeSafeTrainer:
             ls.population
         FROM monthly_aggregations ma
         LEFT JOIN location_stats ls ON ma.location_id = ls.location_id
+        {where}
         ORDER BY ma.location_id, ma.year, ma.month
         """
+        params = None
+        where = ""
+        if years is not None:
+            where = "WHERE ma.year = ANY(%s)"
+            params = (list(years),)
         
-        df = pd.read_sql_query(query, conn)
-        conn.close()
+        try:
+            if self.data_cache is not None:
+                df = self._load_cached_monthly(conn, query, years)
+            else:
+                chunks, columns = self._stream_monthly(conn, query.format(where=where), params)
+                df = concat_monthly_chunks(chunks, columns)
+        finally:
+            conn.close()
         
-        print(f"Loaded {len(df)} monthly aggregation records")
+        years_label = f" for years {sorted(years)}" if years is not None else ""
+        print(f"Loaded {len(df)} monthly aggregation records{years_label} "
+              f"({df.memory_usage(deep=True).sum() / 1e6:.1f} MB)")
         return df
     
+    def _stream_monthly(self, conn, query, params):
+        """Fetch query results from a server-side cursor, compacting each batch as it arrives"""
+        chunks = []
+        columns = None
+        with conn.cursor(name="monthly_aggregations_stream") as cursor:
+            cursor.itersize = LOAD_BATCH_SIZE
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(LOAD_BATCH_SIZE)
+                if columns is None and cursor.description is not None:
+                    columns = [col[0] for col in cursor.description]
+                if not rows:
+                    break
+                chunks.append(compact_monthly_frame(pd.DataFrame.from_records(rows, columns=columns)))
+        return chunks, columns or []
+    
+    def _load_cached_monthly(self, conn, query, years):
+        """Refresh only the (year, month) partitions whose source rows changed, then read from the cache"""
+        cache = self.data_cache
+        with conn.cursor() as cursor:
+            cursor.execute(MONTHLY_WATERMARK_QUERY)
+            watermarks = {cache.partition_key(year, month): mark for year, month, mark in cursor.fetchall()}
+            cursor.execute(LOCATION_STATS_WATERMARK_QUERY)
+            location_stats_mark = cursor.fetchone()[0]
+        
+        stale = cache.stale_partitions(watermarks, location_stats_mark)
+        cache.drop_missing(watermarks)
+        if stale:
+            codes = [int(key[:4]) * 100 + int(key[5:]) for key in stale]
+            chunks, columns = self._stream_monthly(
+                conn, query.format(where="WHERE ma.year * 100 + ma.month = ANY(%s)"), (codes,)
+            )
+            fetched = concat_monthly_chunks(chunks, columns)
+            for (year, month), part in fetched.groupby(['year', 'month']):
+                part = part.assign(location_id=part['location_id'].cat.remove_unused_categories())
+                key = cache.partition_key(year, month)
+                cache.write_partition(key, part, watermarks[key])
+            cache.manifest['location_stats'] = location_stats_mark
+        cache.save_manifest('monthly')
+        print(f"Training cache: refreshed {len(stale)} of {len(watermarks)} month partitions")
+        
+        frames = [compact_monthly_frame(frame) for frame in cache.read_partitions(years)]
+        columns = list(frames[0].columns) if frames else []
+        df = concat_monthly_chunks(frames, columns)
+        return df.sort_values(['location_id', 'year', 'month']).reset_index(drop=True)
+    
+    def load_split_data(self):
+        """Load train and test years with separate queries, so the split happens in SQL"""
+        train_df = self.load_data(years=TRAIN_YEARS)
+        test_df = self.load_data(years=[TEST_YEAR])
+        self.verify_year_split(train_df, test_df)
+        return train_df, test_df
+    
     def enforce_year_split(self, df):
         """CRITICAL: Enforce strict year-based train/test split"""
+        train_df = df[df['year'].isin(TRAIN_YEARS)].copy()
+        test_df = df[df['year'] == TEST_YEAR].copy()
+        self.verify_year_split(train_df, test_df)
+        return train_df, test_df
+    
+    def verify_year_split(self, train_df, test_df):
+        """Report the split and assert no test-year rows leaked into training"""
         print(f"\n{'='*60}")
         print("ENFORCING YEAR SPLIT POLICY")
         print(f"{'='*60}")
         
-        train_df = df[df['year'].isin(TRAIN_YEARS)].copy()
-        test_df = df[df['year'] == TEST_YEAR].copy()
-        
         print(f"Training data: {len(train_df)} records from years {TRAIN_YEARS}")
         print(f"Test data: {len(test_df)} records from year {TEST_YEAR}")
         print(f"Train years: {sorted(train_df['year'].unique())}")
@@ -104,8 +499,6 @@ class CrimeSafeTrainer:
         
         print("Year split verified - no data leakage")
         print(f"{'='*60}\n")
-        
-        return train_df, test_df
     
     def engineer_features(self, df):
         """Create lag features, rolling statistics, and seasonality indicators"""
@@ -116,28 +509,7 @@ class CrimeSafeTrainer:
         # Create date column for easier manipulation
         df['date'] = pd.to_datetime(df[['year', 'month']].assign(day=1))
         
-        features = []
-        
-        for location_id in df['location_id'].unique():
-            loc_df = df[df['location_id'] == location_id].copy()
-            
-            # Lag features (1, 3, 6, 12 months)
-            loc_df['lag_1'] = loc_df['crime_count'].shift(1)
-            loc_df['lag_3'] = loc_df['crime_count'].shift(3)
-            loc_df['lag_6'] = loc_df['crime_count'].shift(6)
-            loc_df['lag_12'] = loc_df['crime_count'].shift(12)
-            
-            # Rolling statistics
-            loc_df['rolling_mean_3'] = loc_df['crime_count'].rolling(window=3, min_periods=1).mean()
-            loc_df['rolling_std_3'] = loc_df['crime_count'].rolling(window=3, min_periods=1).std()
-            loc_df['rolling_mean_6'] = loc_df['crime_count'].rolling(window=6, min_periods=1).mean()
-            
-            # Trend (linear)
-            loc_df['trend'] = np.arange(len(loc_df))
-            
-            features.append(loc_df)
-        
-        df = pd.concat(features, ignore_index=True)
+        df = add_location_features(df)
         
         # Seasonality features
         df['month_sin'] = np.sin(2 * np.pi * df['month'] / 12)
@@ -155,7 +527,7 @@ class CrimeSafeTrainer:
         print(f"Feature engineering complete. Shape: {df.shape}")
         return df
     
-    def train_xgboost_model(self, train_df, test_df):
+    def train_xgboost_model(self, train_df, test_df, n_jobs=-1):
         """Train XGBoost model for crime count prediction"""
         print("\n" + "="*60)
         print("Training XGBoost Model")
@@ -182,30 +554,48 @@ class CrimeSafeTrainer:
         y_train = train_clean['crime_count']
         X_test = test_clean[feature_cols]
         y_test = test_clean['crime_count']
+        trained_through = int(month_key(train_clean).max())
         
-        # Scale features
-        scaler = StandardScaler()
-        X_train_scaled = scaler.fit_transform(X_train)
-        X_test_scaled = scaler.transform(X_test)
-        
-        self.scalers['xgboost'] = scaler
+        fitted = None
+        if INCREMENTAL_TRAINING:
+            previous = self.load_previous_xgboost()
+            if previous is None:
+                print("No previous XGBoost model found, running a full fit")
+            else:
+                fitted = self._fit_incremental(previous, train_clean, test_clean, n_jobs)
         
-        # Train XGBoost
-        model = xgb.XGBRegressor(
-            n_estimators=200,
-            max_depth=6,
-            learning_rate=0.1,
-            subsample=0.8,
-            colsample_bytree=0.8,
-            random_state=42,
-            n_jobs=-1
-        )
+        if fitted is not None:
+            model, scaler, training = fitted
+            X_train_scaled = scaler.transform(X_train)
+            X_test_scaled = scaler.transform(X_test)
+        else:
+            # Scale features
+            scaler = StandardScaler()
+            X_train_scaled = scaler.fit_transform(X_train)
+            X_test_scaled = scaler.transform(X_test)
+            
+            # Train XGBoost
+            if TRAINING_PROFILE == 'fast':
+                # Validate on the last training months; the test year is never seen before evaluation
+                keys = month_key(train_clean).to_numpy()
+                validation_keys = np.unique(keys)[-VALIDATION_MONTHS:]
+                is_validation = np.isin(keys, validation_keys)
+                model, fit_report = fit_quantized(
+                    TIME_SERIES_XGB_PARAMS,
+                    X_train_scaled[~is_validation], y_train[~is_validation],
+                    X_train_scaled[is_validation], y_train[is_validation],
+                    n_jobs=n_jobs,
+                )
+            else:
+                model, fit_report = fit_default(
+                    TIME_SERIES_XGB_PARAMS, X_train_scaled, y_train, n_jobs=n_jobs,
+                    eval_set=[(X_test_scaled, y_test)], verbose=False,
+                )
+            training = {'mode': 'full', 'base_version': None, 'rounds_added': fit_report['rounds'], 'fit': fit_report}
         
-        model.fit(
-            X_train_scaled, y_train,
-            eval_set=[(X_test_scaled, y_test)],
-            verbose=False
-        )
+        self.scalers['xgboost'] = scaler
+        print(f"Training mode: {training['mode']} ({training['rounds_added']} rounds added"
+              f"{', base ' + training['base_version'] if training['base_version'] else ''})")
         
         # Predictions
         y_pred_train = model.predict(X_train_scaled)
@@ -231,17 +621,7 @@ class CrimeSafeTrainer:
         for feat, imp in sorted_importance[:10]:
             print(f"  {feat}: {imp:.4f}")
         
-        # SHAP explainability
-        explainer = None
-        shap_values = None
-        if shap is not None:
-            try:
-                print("\nCalculating SHAP values...")
-                explainer = shap.TreeExplainer(model)
-                shap_values = explainer.shap_values(X_test_scaled[:100])  # Sample for speed
-                print("✓ SHAP values calculated")
-            except Exception as e:
-                print(f"SHAP calculation failed: {e}")
+        # SHAP explanations are computed on demand by scripts/explanations.py, not stored here
         
         self.models['xgboost'] = {
             'model': model,
@@ -254,59 +634,101 @@ class CrimeSafeTrainer:
                 'test_mae': float(test_mae),
             },
             'feature_importance': {k: float(v) for k, v in sorted_importance},
-            'explainer': explainer,
+            'trained_through': trained_through,
+            'training': training,
         }
         
         return model, test_rmse, test_mae
     
-    def classify_zones(self, df, predictions):
-        """Classify locations into red/amber/green zones"""
-        print("\nClassifying zones...")
+    def load_previous_xgboost(self):
+        """Latest saved time-series model artifact (versions sort by timestamp), or None"""
+        paths = sorted(MODEL_DIR.glob("xgboost_*.joblib"))
+        if not paths:
+            return None
+        previous = joblib.load(paths[-1])
+        previous['version'] = paths[-1].stem[len("xgboost_"):]
+        return previous
+    
+    def _fit_incremental(self, previous, train_clean, test_clean, n_jobs):
+        """Add boosting rounds to the previous model using only months it hasn't seen.
+
+        Returns (model, scaler, training info), or None to fall back to a full fit
+        when the previous artifact can't be continued or its test RMSE regresses.
+        """
+        feature_cols = self.feature_names
+        if previous.get('feature_cols') != feature_cols or 'trained_through' not in previous:
+            print(f"Model {previous['version']} has different features or no training watermark, running a full fit")
+            return None
         
-        # Thresholds (configurable)
-        RED_THRESHOLD = 50
-        AMBER_THRESHOLD = 20
+        # Continued trees must see features on the scale the base trees were fit on
+        scaler = previous['scaler']
+        X_test_scaled = scaler.transform(test_clean[feature_cols])
+        y_test = test_clean['crime_count']
+        previous_rmse = np.sqrt(mean_squared_error(y_test, previous['model'].predict(X_test_scaled)))
         
-        classifications = []
-        for pred in predictions:
-            if pred > RED_THRESHOLD:
-                classifications.append('red')
-            elif pred > AMBER_THRESHOLD:
-                classifications.append('amber')
-            else:
-                classifications.append('green')
+        new_rows = train_clean[month_key(train_clean) > previous['trained_through']]
+        training = {'mode': 'incremental', 'base_version': previous['version'], 'rounds_added': 0}
+        if new_rows.empty:
+            print(f"No months after {previous['trained_through']}, keeping model {previous['version']}")
+            return previous['model'], scaler, training
         
-        return classifications
-    
-    def evaluate_classification(self, test_df, predictions):
-        """Evaluate zone classification accuracy"""
-        print("\nEvaluating zone classification...")
+        print(f"Continuing model {previous['version']} on {len(new_rows)} rows "
+              f"after {previous['trained_through']} (+{INCREMENTAL_ROUNDS} rounds)")
+        model = xgb.XGBRegressor(**{**TIME_SERIES_XGB_PARAMS, 'n_estimators': INCREMENTAL_ROUNDS}, n_jobs=n_jobs)
+        model.fit(
+            scaler.transform(new_rows[feature_cols]), new_rows['crime_count'],
+            xgb_model=previous['model'].get_booster(),
+            verbose=False
+        )
         
-        test_clean = test_df.dropna(subset=['crime_count'])
-        y_true_zones = []
+        test_rmse = np.sqrt(mean_squared_error(y_test, model.predict(X_test_scaled)))
+        print(f"Test RMSE: previous {previous_rmse:.2f}, incremental {test_rmse:.2f}")
+        if test_rmse > previous_rmse * (1 + INCREMENTAL_TOLERANCE):
+            print(f"Incremental model regressed by more than {INCREMENTAL_TOLERANCE:.0%}, running a full fit")
+            return None
         
-        RED_THRESHOLD = 50
-        AMBER_THRESHOLD = 20
+        training['rounds_added'] = INCREMENTAL_ROUNDS
+        return model, scaler, training
+    
+    def classify_zones(self, df, predictions):
+        """Classify locations into red/amber/green zones.
+
+        predictions is a Series indexed like df (or an array with one value per
+        row of df); returns a categorical Series of zone labels on df's index.
+        """
+        print("\nClassifying zones...")
         
-        for count in test_clean['crime_count']:
-            if count > RED_THRESHOLD:
-                y_true_zones.append('red')
-            elif count > AMBER_THRESHOLD:
-                y_true_zones.append('amber')
-            else:
-                y_true_zones.append('green')
+        if not isinstance(predictions, pd.Series):
+            if len(predictions) != len(df):
+                raise ValueError(f"Got {len(predictions)} predictions for {len(df)} rows")
+            predictions = pd.Series(predictions, index=df.index)
+        codes = zone_codes(predictions.reindex(df.index))
+        return pd.Series(pd.Categorical.from_codes(codes, ZONE_LABELS), index=df.index, name='zone')
+    
+    def evaluate_classification(self, test_df, predictions):
+        """Evaluate zone classification accuracy.
+
+        predictions is a Series indexed by the test_df rows it was computed for;
+        actual and predicted zones are matched on that index.
+        """
+        print("\nEvaluating zone classification...")
         
-        y_pred_zones = self.classify_zones(test_clean, predictions)
+        if not isinstance(predictions, pd.Series):
+            raise TypeError("predictions must be a Series indexed by test_df rows")
+        missing = predictions.index.difference(test_df.index)
+        if len(missing):
+            raise ValueError(f"{len(missing)} predictions have no matching test row")
         
-        # Ensure same length
-        min_len = min(len(y_true_zones), len(y_pred_zones))
-        y_true_zones = y_true_zones[:min_len]
-        y_pred_zones = y_pred_zones[:min_len]
+        actual_counts = test_df.loc[predictions.index, 'crime_count']
+        scored = actual_counts.notna().to_numpy()
+        y_true_codes = zone_codes(actual_counts.to_numpy()[scored])
+        y_pred_codes = zone_codes(predictions.to_numpy()[scored])
         
-        accuracy = accuracy_score(y_true_zones, y_pred_zones)
-        conf_matrix = confusion_matrix(y_true_zones, y_pred_zones, labels=['green', 'amber', 'red'])
+        conf_matrix = zone_confusion_matrix(y_true_codes, y_pred_codes)
+        accuracy = np.trace(conf_matrix) / conf_matrix.sum() if conf_matrix.sum() else 0.0
         
-        print(f"Zone Classification Accuracy: {accuracy:.2%}")
+        print(f"Zone Classification Accuracy: {accuracy:.2%} "
+              f"(amber > {AMBER_THRESHOLD:g}, red > {RED_THRESHOLD:g}, {scored.sum()} rows)")
         print("\nConfusion Matrix:")
         print("                Predicted")
         print("              Green  Amber  Red")
@@ -322,33 +744,43 @@ class CrimeSafeTrainer:
         csv_path = Path("crime_dataset_india.csv")
         if not csv_path.exists():
             raise FileNotFoundError(f"Raw crime data CSV not found at {csv_path}")
-        df = pd.read_csv(csv_path)
-        print(f"Loaded {len(df)} raw crime records from CSV")
+        if self.data_cache is not None:
+            df = self.data_cache.read_raw_csv(csv_path)
+            if df is not None:
+                print(f"Loaded {len(df)} raw crime records from training cache")
+                return df
+        df = read_raw_crime_csv(csv_path)
+        print(f"Loaded {len(df)} raw crime records from CSV ({RAW_CSV_ENGINE} engine)")
+        if self.data_cache is not None:
+            try:
+                self.data_cache.write_raw_csv(csv_path, df)
+            except (ValueError, TypeError) as e:
+                print(f"Could not cache raw crime data: {e}")
         return df
 
+    def _load_locations(self):
+        """location_stats coordinates as plain lists, or None if the database can't be reached"""
+        try:
+            conn = psycopg2.connect(self.db_url)
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(LOCATION_COORDINATES_QUERY)
+                    rows = cursor.fetchall()
+            finally:
+                conn.close()
+        except psycopg2.Error as e:
+            print(f"Could not load location coordinates, radius recommendations disabled: {e}")
+            return None
+        columns = ['location_id', 'location_name', 'city', 'latitude', 'longitude']
+        locations = {col: [row[i] for row in rows] for i, col in enumerate(columns)}
+        locations['latitude'] = [float(value) for value in locations['latitude']]
+        locations['longitude'] = [float(value) for value in locations['longitude']]
+        print(f"Loaded coordinates for {len(rows)} locations")
+        return locations
+
     def _preprocess_safety_data(self, df):
         print("Preprocessing data for personalized safety model...")
-        df_clean = df.copy()
-        df_clean = df_clean.dropna()
-        df_clean = df_clean.drop_duplicates()
-
-        date_columns = ['Date Reported', 'Date of Occurrence']
-        for col in date_columns:
-            if col in df_clean.columns:
-                df_clean[col] = pd.to_datetime(df_clean[col], errors='coerce')
-        
-        categorical_columns = ['City', 'Crime Description', 'Victim Gender', 'Weapon Used', 'Crime Domain']
-        for col in categorical_columns:
-            if col in df_clean.columns:
-                df_clean[col] = df_clean[col].astype(str).str.strip().str.title()
-
-        if 'Victim Age' in df_clean.columns:
-            df_clean['Victim Age'] = pd.to_numeric(df_clean['Victim Age'], errors='coerce')
-            df_clean = df_clean[df_clean['Victim Age'].between(0, 100)]
-        
-        if 'Date of Occurrence' in df_clean.columns:
-            df_clean['Year'] = df_clean['Date of Occurrence'].dt.year
-        
+        df_clean = clean_raw_crime_data(df)
         print(f"Data after preprocessing for safety model: {df_clean.shape}")
         return df_clean
 
@@ -410,7 +842,7 @@ class CrimeSafeTrainer:
 
         return X, y, label_encoders, available_features
     
-    def train_personalized_safety_model(self):
+    def train_personalized_safety_model(self, n_jobs=-1):
         print("\n" + "="*60)
         print("Training Personalized City Safety Model")
         print("="*60)
@@ -432,11 +864,26 @@ class CrimeSafeTrainer:
         self.safety_label_encoders = label_encoders
         self.safety_feature_columns = feature_columns
         self.all_cities = train_features['City'].unique().tolist()
-        self.train_features_stats = train_features.describe()
+        # Plain floats instead of a pickled describe() frame, so loaders don't need pandas
+        self.train_feature_means = {
+            col: float(value) for col, value in train_features.mean(numeric_only=True).items()
+        }
+        city_means = train_features.groupby('City')[STAT_COLUMNS].mean()
+        self.city_stats = {col: {city: float(v) for city, v in city_means[col].items()} for col in STAT_COLUMNS}
 
         # Train XGBoost model (as chosen in the notebook)
-        model = xgb.XGBRegressor(n_estimators=100, random_state=42, max_depth=5)
-        model.fit(X_train, y_train)
+        params = {'n_estimators': 100, 'random_state': 42, 'max_depth': 5}
+        if TRAINING_PROFILE == 'fast':
+            # Rows are (city, age, gender, year) aggregates from the training years, so a random holdout keeps the year split
+            is_validation = np.random.default_rng(42).random(len(X_train)) < SAFETY_VALIDATION_FRACTION
+            model, fit_report = fit_quantized(
+                params,
+                X_train[~is_validation], y_train[~is_validation],
+                X_train[is_validation], y_train[is_validation],
+                n_jobs=n_jobs,
+            )
+        else:
+            model, fit_report = fit_default(params, X_train, y_train, n_jobs=n_jobs)
         self.best_safety_model = model
 
         print(f"Personalized safety model trained: {model.__class__.__name__}")
@@ -450,12 +897,24 @@ class CrimeSafeTrainer:
             'label_encoders': self.safety_label_encoders,
             'feature_columns': self.safety_feature_columns,
             'all_cities': self.all_cities,
-            'train_features_stats': self.train_features_stats
+            'train_feature_means': self.train_feature_means,
+            'city_stats': self.city_stats,
+            'locations': self._load_locations(),
         }
         safety_model_path = Path("scripts") / 'city_safety_predictor_model.pkl'
         joblib.dump(model_data, safety_model_path)
         print(f"✓ Saved personalized safety model: {safety_model_path}")
 
+        # Native bundle (booster UBJSON + vocabularies + city stats .npy), preferred by the loaders
+        bundle_path = save_bundle(MODEL_DIR / f"{BUNDLE_PREFIX}{MODEL_VERSION}", model_data, MODEL_VERSION)
+        print(f"✓ Saved personalized safety bundle: {bundle_path}")
+
+        return {
+            'safety_fit': fit_report,
+            'safety_cities': len(self.all_cities),
+            'safety_bundle': str(bundle_path),
+        }
+
     def save_models(self):
         """Save trained models and metadata"""
         print(f"\nSaving models to {MODEL_DIR}...")
@@ -480,6 +939,8 @@ class CrimeSafeTrainer:
                 'metrics': self.models['xgboost']['metrics'],
                 'feature_importance': self.models['xgboost']['feature_importance'],
                 'feature_cols': self.models['xgboost']['feature_cols'],
+                'trained_through': self.models['xgboost']['trained_through'],
+                'training': self.models['xgboost']['training'],
             }
         
         metadata_path = MODEL_DIR / f"metadata_{MODEL_VERSION}.json"
@@ -489,53 +950,183 @@ class CrimeSafeTrainer:
         
         return MODEL_VERSION
     
-    def run_training_pipeline(self):
-        """Execute full training pipeline"""
-        print("\n" + "="*60)
-        print("CRIMESAFE ML TRAINING PIPELINE")
-        print("="*60)
-        print(f"Model Version: {MODEL_VERSION}")
-        print(f"Train Years: {TRAIN_YEARS}")
-        print(f"Test Year: {TEST_YEAR}")
-        print("="*60 + "\n")
-        
-        # --- Time-series model training ---
-        df = self.load_data()
-        train_df, test_df = self.enforce_year_split(df)
+    def save_feature_rows(self, frames):
+        """Save the engineered rows the time-series model scored, for on-demand explanations.
+
+        Trend and lat/lon normalisation depend on the frame a row was engineered
+        in, so explanations read these rows instead of re-engineering features.
+        """
+        rows = pd.concat([df.dropna(subset=self.feature_names + ['crime_count']) for df in frames], ignore_index=True)
+        feature_rows = {
+            'feature_cols': self.feature_names,
+            'location_id': rows['location_id'].astype(str).to_numpy(),
+            'year': rows['year'].to_numpy(dtype=np.int32),
+            'month': rows['month'].to_numpy(dtype=np.int32),
+            'crime_count': rows['crime_count'].to_numpy(dtype=np.float64),
+            'features': rows[self.feature_names].to_numpy(dtype=np.float64),
+        }
+        path = MODEL_DIR / f"features_{MODEL_VERSION}.joblib"
+        joblib.dump(feature_rows, path)
+        print(f"✓ Saved {len(rows)} engineered feature rows: {path}")
+        return path
+    
+    def train_time_series_model(self, n_jobs=-1):
+        """Load, split and feature-engineer monthly data, then fit, evaluate and save the XGBoost model"""
+        if SPLIT_IN_SQL:
+            train_df, test_df = self.load_split_data()
+        else:
+            df = self.load_data()
+            train_df, test_df = self.enforce_year_split(df)
+            del df
         train_df = self.engineer_features(train_df)
         test_df = self.engineer_features(test_df)
-        model, test_rmse, test_mae = self.train_xgboost_model(train_df, test_df)
+        model, test_rmse, test_mae = self.train_xgboost_model(train_df, test_df, n_jobs=n_jobs)
         
         test_clean = test_df.dropna(subset=self.feature_names + ['crime_count'])
         X_test = test_clean[self.feature_names]
         X_test_scaled = self.scalers['xgboost'].transform(X_test)
-        predictions = model.predict(X_test_scaled)
+        predictions = pd.Series(model.predict(X_test_scaled), index=test_clean.index)
         accuracy, conf_matrix = self.evaluate_classification(test_df, predictions)
         self.models['xgboost']['metrics']['classification_accuracy'] = float(accuracy)
         self.models['xgboost']['metrics']['confusion_matrix'] = conf_matrix
 
-        # --- Personalized safety model training ---
-        self.train_personalized_safety_model()
-
         # Save time-series models (the personalized model is saved within its own function)
-        model_version = self.save_models()
+        self.save_models()
+        self.save_feature_rows([train_df, test_df])
+
+        forecast_export = None
+        if PREDICTION_EXPORT:
+            forecast_export = self.export_zone_forecasts(pd.concat([train_df, test_df], ignore_index=True), model, test_rmse)
+
+        return {
+            'forecast_export': forecast_export,
+            'test_rmse': float(test_rmse),
+            'test_mae': float(test_mae),
+            'classification_accuracy': float(accuracy),
+            'training_mode': self.models['xgboost']['training']['mode'],
+            'time_series_fit': self.models['xgboost']['training'].get('fit'),
+        }
+
+    def export_zone_forecasts(self, history_df, model, test_rmse):
+        """Score every location over FORECAST_HORIZON_MONTHS and bulk-write the rows to the predictions table"""
+        print(f"\nExporting {FORECAST_HORIZON_MONTHS}-month zone forecasts...")
+        start = time.perf_counter()
+        
+        locations, counts = latest_history(history_df)
+        forecaster = RecursiveForecaster(model, self.scalers['xgboost'], self.feature_names)
+        keys, predicted = forecaster.forecast(locations, counts, FORECAST_HORIZON_MONTHS)
+        predicted = predicted.ravel()
+        
+        # 95% interval from the test-year RMSE
+        margin = 1.96 * float(test_rmse)
+        zones = pd.Series(np.array(ZONE_LABELS)[zone_codes(predicted)])
+        predictions = pd.DataFrame({
+            'location_id': keys['location_id'],
+            'year': keys['year'],
+            'month': keys['month'],
+            'predicted_rate': np.round(predicted, 2),
+            'ci_lower': np.round(np.clip(predicted - margin, 0, None), 2),
+            'ci_upper': np.round(predicted + margin, 2),
+            'model_version': MODEL_VERSION,
+            'explanation': 'Forecast zone: ' + zones + '. ' + keys['step'].astype(str) + '-month-ahead XGBoost forecast',
+        })
+        scored_seconds = time.perf_counter() - start
+        
+        conn = psycopg2.connect(self.db_url)
+        try:
+            written = write_predictions(conn, predictions, method=EXPORT_METHOD, batch_size=EXPORT_BATCH_SIZE)
+        finally:
+            conn.close()
+        
+        seconds = time.perf_counter() - start
+        print(f"✓ Wrote {written} forecasts for {len(locations)} locations "
+              f"(scored in {scored_seconds:.2f}s, {seconds:.2f}s total, {EXPORT_METHOD} in batches of {EXPORT_BATCH_SIZE})")
+        return {
+            'rows': written,
+            'locations': len(locations),
+            'horizon_months': FORECAST_HORIZON_MONTHS,
+            'zones': zones.value_counts().to_dict(),
+            'seconds': round(seconds, 2),
+        }
+
+    def run_branch(self, branch, n_jobs=-1):
+        """Run one training branch, returning its metrics and wall time"""
+        train_branch = {
+            'time_series': self.train_time_series_model,
+            'personalized_safety': self.train_personalized_safety_model,
+        }[branch]
+        start = time.perf_counter()
+        metrics = train_branch(n_jobs=n_jobs)
+        return {'metrics': metrics, 'seconds': time.perf_counter() - start, 'n_jobs': n_jobs}
+
+    def run_branches(self, branches):
+        """Run independent training branches, concurrently when TRAINING_WORKERS > 1"""
+        # One process per branch, but no more processes than CPUs to give them
+        workers = min(TRAINING_WORKERS, len(branches), TRAINING_CPUS)
+        if workers <= 1:
+            return {branch: self.run_branch(branch) for branch in branches}
+
+        budgets = cpu_budgets(branches)
+        print(f"Training {', '.join(branches)} in {workers} processes "
+              f"(CPU budgets: {', '.join(f'{b}={n}' for b, n in budgets.items())})\n")
+        # spawn rather than fork: XGBoost's OpenMP runtime is not fork-safe
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_training_worker,
+                                 initargs=(MODEL_VERSION,)) as pool:
+            futures = {
+                branch: pool.submit(_run_training_branch, branch, budgets[branch])
+                for branch in branches
+            }
+            return {branch: future.result() for branch, future in futures.items()}
+
+    def run_training_pipeline(self):
+        """Execute full training pipeline"""
+        print("\n" + "="*60)
+        print("CRIMESAFE ML TRAINING PIPELINE")
+        print("="*60)
+        print(f"Model Version: {MODEL_VERSION}")
+        print(f"Train Years: {TRAIN_YEARS}")
+        print(f"Test Year: {TEST_YEAR}")
+        print("="*60 + "\n")
+        
+        start = time.perf_counter()
+        branch_results = self.run_branches(list(BRANCH_CPU_WEIGHTS))
+        wall_seconds = time.perf_counter() - start
+        time_series = branch_results['time_series']['metrics']
         
         print("\n" + "="*60)
         print("TRAINING COMPLETE")
         print("="*60)
-        print(f"Model Version: {model_version}")
-        print(f"Time-Series Test RMSE: {test_rmse:.2f}")
-        print(f"Time-Series Test MAE: {test_mae:.2f}")
-        print(f"Time-Series Classification Accuracy: {accuracy:.2%}")
+        print(f"Model Version: {MODEL_VERSION}")
+        print(f"Time-Series Test RMSE: {time_series['test_rmse']:.2f}")
+        print(f"Time-Series Test MAE: {time_series['test_mae']:.2f}")
+        print(f"Time-Series Classification Accuracy: {time_series['classification_accuracy']:.2%}")
+        for branch, result in branch_results.items():
+            print(f"Branch {branch}: {result['seconds']:.1f}s (n_jobs={result['n_jobs']})")
+        print(f"Wall time: {wall_seconds:.1f}s "
+              f"(branches sum to {sum(r['seconds'] for r in branch_results.values()):.1f}s)")
         print("="*60 + "\n")
         
         return {
-            'model_version': model_version,
-            'test_rmse': float(test_rmse),
-            'test_mae': float(test_mae),
-            'classification_accuracy': float(accuracy),
+            'model_version': MODEL_VERSION,
+            **time_series,
+            **branch_results['personalized_safety']['metrics'],
+            'branch_seconds': {branch: round(r['seconds'], 2) for branch, r in branch_results.items()},
+            'wall_seconds': round(wall_seconds, 2),
         }
 
+
+def _init_training_worker(model_version):
+    """Pool initializer: spawned workers re-import this module, so pin them to the parent's version"""
+    global MODEL_VERSION
+    MODEL_VERSION = model_version
+
+
+def _run_training_branch(branch, n_jobs):
+    """Pool task: train one branch with a fresh trainer in the worker process"""
+    return CrimeSafeTrainer().run_branch(branch, n_jobs=n_jobs)
+
 if __name__ == "__main__":
     trainer = CrimeSafeTrainer()
     results = trainer.run_training_pipeline()
@@ -0,0 +1,126 @@
+"""
+Local columnar cache of CrimeSafeTrainer inputs.
+Monthly aggregations are stored as one Parquet file per (year, month) under
+year=<year>/ directories, the raw crime CSV as a single Parquet file, and a
+manifest per input (monthly_manifest.json, raw_csv_manifest.json) records the
+source watermark each file was written from. Training branches load different
+inputs in separate processes, so each only ever rewrites its own manifest.
+"""
+
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (pandas Parquet engine)
+except ImportError:
+    pyarrow = None
+
+# Manifest file per input -> the manifest keys it holds
+MANIFESTS = {
+    'monthly': ('monthly', 'location_stats'),
+    'raw_csv': ('raw_csv',),
+}
+LEGACY_MANIFEST_NAME = 'manifest.json'  # single manifest written by earlier versions
+
+
+class TrainingDataCache:
+    def __init__(self, cache_dir):
+        if pyarrow is None:
+            raise ImportError("pyarrow is required for the training data cache")
+        self.cache_dir = Path(cache_dir)
+        self.monthly_dir = self.cache_dir / 'monthly'
+        self.monthly_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest = {'monthly': {}, 'location_stats': None, 'raw_csv': None}
+        legacy_path = self.cache_dir / LEGACY_MANIFEST_NAME
+        legacy = {}
+        if legacy_path.exists():
+            with open(legacy_path) as f:
+                legacy = json.load(f)
+        for name, keys in MANIFESTS.items():
+            path = self.manifest_path(name)
+            if path.exists():
+                with open(path) as f:
+                    self.manifest.update({key: value for key, value in json.load(f).items() if key in keys})
+            else:
+                self.manifest.update({key: legacy[key] for key in keys if key in legacy})
+
+    def manifest_path(self, name):
+        return self.cache_dir / f"{name}_manifest.json"
+
+    def save_manifest(self, name):
+        """Write the manifest of one input ('monthly' or 'raw_csv'), leaving the others untouched"""
+        path = self.manifest_path(name)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({key: self.manifest[key] for key in MANIFESTS[name]}, f, indent=2)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def partition_key(year, month):
+        return f"{int(year):04d}-{int(month):02d}"
+
+    def _partition_path(self, key):
+        year, month = key.split('-')
+        return self.monthly_dir / f"year={year}" / f"month={month}.parquet"
+
+    # --- Monthly aggregations ---
+
+    def stale_partitions(self, watermarks, location_stats_mark):
+        """Partition keys whose source watermark differs from the cached one.
+
+        watermarks maps partition key -> watermark string for every (year, month)
+        currently in the database. A location_stats change invalidates every
+        partition, since its columns are joined into each row.
+        """
+        if location_stats_mark != self.manifest.get('location_stats'):
+            return sorted(watermarks)
+        cached = self.manifest['monthly']
+        return sorted(key for key, mark in watermarks.items() if cached.get(key) != mark)
+
+    def drop_missing(self, watermarks):
+        """Remove cached partitions that no longer exist in the source"""
+        for key in list(self.manifest['monthly']):
+            if key not in watermarks:
+                self._partition_path(key).unlink(missing_ok=True)
+                del self.manifest['monthly'][key]
+
+    def write_partition(self, key, df, watermark):
+        path = self._partition_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        self.manifest['monthly'][key] = watermark
+
+    def read_partitions(self, years=None):
+        """Cached monthly frames, optionally only for the given years"""
+        keys = sorted(self.manifest['monthly'])
+        if years is not None:
+            wanted = {int(year) for year in years}
+            keys = [key for key in keys if int(key.split('-')[0]) in wanted]
+        return [pd.read_parquet(self._partition_path(key)) for key in keys]
+
+    # --- Raw crime CSV ---
+
+    @staticmethod
+    def file_mark(path):
+        stat = os.stat(path)
+        return {'path': str(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def read_raw_csv(self, csv_path):
+        """Cached raw CSV frame, or None if the CSV changed since it was cached"""
+        raw_path = self.cache_dir / 'raw_crime_data.parquet'
+        if self.manifest.get('raw_csv') != self.file_mark(csv_path) or not raw_path.exists():
+            return None
+        return pd.read_parquet(raw_path)
+
+    def write_raw_csv(self, csv_path, df):
+        raw_path = self.cache_dir / 'raw_crime_data.parquet'
+        tmp_path = raw_path.with_suffix('.tmp')
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, raw_path)
+        self.manifest['raw_csv'] = self.file_mark(csv_path)
+        self.save_manifest('raw_csv')
@@ -0,0 +1,172 @@
+"""
+Batch zone forecasts for every location.
+RecursiveForecaster advances all locations together month by month with the
+time-series model, feeding each step's predictions back into the lag and
+rolling features of the next; write_predictions bulk-writes the scored rows to
+the predictions table with COPY or execute_values.
+"""
+
+import io
+import uuid
+import warnings
+
+import numpy as np
+import pandas as pd
+from psycopg2.extras import execute_values
+
+HISTORY_MONTHS = 12  # longest lag used by the time-series model
+LAGS = (1, 3, 6, 12)
+ROLLING = {'rolling_mean_3': (3, 'mean'), 'rolling_std_3': (3, 'std'), 'rolling_mean_6': (6, 'mean')}
+# Per-location features carried into every forecast month from the latest observed row
+STATIC_FEATURES = ['lat_norm', 'lon_norm', 'female_ratio', 'avg_victim_age']
+PREDICTION_COLUMNS = [
+    'id', 'location_id', 'year', 'month', 'predicted_rate',
+    'ci_lower', 'ci_upper', 'model_version', 'explanation',
+]
+
+
+def latest_history(df, history_months=HISTORY_MONTHS):
+    """Last history_months crime counts per location, oldest first and NaN-padded on the left.
+
+    df holds engineered monthly rows (location_id, year, month, crime_count, trend
+    and STATIC_FEATURES). Returns the latest row per location and the counts
+    array, one row per location in the same order.
+    """
+    df = df[df['location_id'].notna()].sort_values(['location_id', 'year', 'month']).reset_index(drop=True)
+    groups = df.groupby('location_id', sort=False, observed=True)
+    tail = groups.tail(history_months)
+    latest = groups.tail(1)
+
+    # Location row and column (newest month in the last column) for every tail value
+    row = groups.ngroup().loc[tail.index].to_numpy()
+    position = history_months - 1 - tail.groupby('location_id', sort=False, observed=True).cumcount(ascending=False)
+    counts = np.full((len(latest), history_months), np.nan)
+    counts[row, position.to_numpy()] = tail['crime_count'].to_numpy(dtype=np.float64)
+
+    latest = latest[['location_id', 'year', 'month', 'trend'] + STATIC_FEATURES].reset_index(drop=True)
+    return latest, counts
+
+
+class RecursiveForecaster:
+    """Multi-horizon forecasts for many locations from a one-step time-series model.
+
+    Features follow engineer_features/add_location_features. History and
+    forecasts share one preallocated (locations, history + horizon) counts
+    buffer and a single feature matrix is rewritten in place each step, so a
+    step is a few column updates plus one batched predict for every location.
+    """
+
+    def __init__(self, model, scaler, feature_cols):
+        self.model = model
+        self.feature_cols = list(feature_cols)
+        self.column = {col: i for i, col in enumerate(self.feature_cols)}
+        # StandardScaler.transform, applied in place on the feature matrix
+        self.mean = np.asarray(scaler.mean_, dtype=np.float64)
+        self.scale = np.asarray(scaler.scale_, dtype=np.float64)
+
+        known = {f'lag_{lag}' for lag in LAGS} | set(ROLLING) | set(STATIC_FEATURES) | {
+            'trend', 'month_sin', 'month_cos', 'is_summer', 'is_winter',
+        }
+        unknown = [col for col in self.feature_cols if col not in known]
+        if unknown:
+            raise ValueError(f"Cannot forecast features: {unknown}")
+
+    def _set(self, X, col, values):
+        if col in self.column:
+            X[:, self.column[col]] = values
+
+    def forecast(self, locations, counts, horizon):
+        """Forecast horizon months after each location's last observed month.
+
+        locations and counts come from latest_history. Returns (keys frame with
+        location_id/year/month/step ordered by location then step, predictions
+        array of shape (locations, horizon)).
+        """
+        n_locations, history_months = counts.shape
+        buffer = np.empty((n_locations, history_months + horizon))
+        buffer[:, :history_months] = counts
+        X = np.empty((n_locations, len(self.feature_cols)))
+        X_scaled = np.empty_like(X)
+        predictions = np.empty((n_locations, horizon))
+
+        for col in STATIC_FEATURES:
+            self._set(X, col, locations[col].to_numpy(dtype=np.float64))
+        last_trend = locations['trend'].to_numpy(dtype=np.float64)
+        last_month_index = (locations['year'].to_numpy(dtype=np.int64) * 12
+                            + locations['month'].to_numpy(dtype=np.int64) - 1)
+
+        with warnings.catch_warnings():
+            # Windows with fewer than two counts give NaN, as pandas rolling(min_periods=1).std() does
+            warnings.simplefilter('ignore', RuntimeWarning)
+            for step in range(1, horizon + 1):
+                t = history_months - 1 + step
+                # Rolling windows include the target month itself; until it is predicted,
+                # its count is the previous month's (persistence)
+                buffer[:, t] = buffer[:, t - 1]
+
+                for lag in LAGS:
+                    self._set(X, f'lag_{lag}', buffer[:, t - lag])
+                for col, (window, stat) in ROLLING.items():
+                    values = buffer[:, t - window + 1:t + 1]
+                    self._set(X, col, np.nanmean(values, axis=1) if stat == 'mean' else np.nanstd(values, axis=1, ddof=1))
+                self._set(X, 'trend', last_trend + step)
+                month = (last_month_index + step) % 12 + 1
+                self._set(X, 'month_sin', np.sin(2 * np.pi * month / 12))
+                self._set(X, 'month_cos', np.cos(2 * np.pi * month / 12))
+                self._set(X, 'is_summer', (month >= 4) & (month <= 6))
+                self._set(X, 'is_winter', (month == 12) | (month <= 2))
+
+                np.subtract(X, self.mean, out=X_scaled)
+                np.divide(X_scaled, self.scale, out=X_scaled)
+                # Counts can't go negative; clipping also keeps the recursion from drifting below zero
+                buffer[:, t] = np.maximum(self.model.predict(X_scaled), 0)
+                predictions[:, step - 1] = buffer[:, t]
+
+        steps = np.arange(1, horizon + 1)
+        month_index = last_month_index[:, None] + steps
+        keys = pd.DataFrame({
+            'location_id': np.repeat(locations['location_id'].astype(str).to_numpy(), horizon),
+            'year': (month_index // 12).ravel(),
+            'month': (month_index % 12 + 1).ravel(),
+            'step': np.tile(steps, n_locations),
+        })
+        return keys, predictions
+
+
+def write_predictions(conn, predictions, method='copy', batch_size=5000):
+    """Replace forecasts for the same locations and months, then bulk-insert predictions.
+
+    predictions has every PREDICTION_COLUMNS column except id, which is generated
+    here. Rows go out batch_size at a time with COPY (method='copy') or
+    execute_values; everything runs in one transaction. Returns the row count.
+    """
+    if method not in ('copy', 'values'):
+        raise ValueError(f"Unknown prediction export method: {method}")
+    if predictions.empty:
+        return 0
+
+    frame = predictions.assign(id=[uuid.uuid4().hex for _ in range(len(predictions))])[PREDICTION_COLUMNS]
+    month_keys = frame['year'] * 100 + frame['month']
+    columns = ', '.join(PREDICTION_COLUMNS)
+
+    with conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM predictions WHERE location_id = ANY(%s) AND year * 100 + month BETWEEN %s AND %s",
+                (frame['location_id'].unique().tolist(), int(month_keys.min()), int(month_keys.max())),
+            )
+            for start in range(0, len(frame), batch_size):
+                batch = frame.iloc[start:start + batch_size]
+                if method == 'copy':
+                    buffer = io.StringIO()
+                    batch.to_csv(buffer, index=False, header=False)
+                    buffer.seek(0)
+                    cursor.copy_expert(f"COPY predictions ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+                else:
+                    execute_values(
+                        cursor,
+                        f"INSERT INTO predictions ({columns}) VALUES %s",
+                        batch.to_numpy(dtype=object).tolist(),
+                        page_size=batch_size,
+                    )
+    return len(frame)
@@ -0,0 +1,14 @@
+import app
+
+
+def test_explain_every_city_beyond_max_rows(monkeypatch):
+    explainer = app.registry.active.explainer
+    monkeypatch.setattr(explainer, 'max_rows', 4)
+    cities = list(app.registry.active.feature_table.cities)
+    assert len(cities) > explainer.max_rows
+
+    response = app.app.test_client().post('/explain', json={'age': 30, 'gender': 'F', 'year': 2024})
+
+    assert response.status_code == 200
+    explanations = response.get_json()['explanations']
+    assert [e['city'] for e in explanations] == cities
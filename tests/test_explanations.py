@@ -0,0 +1,107 @@
+import os
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('psycopg2')  # scripts/train.py connects to the database with it
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import StandardScaler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+FEATURE_COLS = [
+    'lag_1', 'lag_3', 'lag_6', 'lag_12',
+    'rolling_mean_3', 'rolling_std_3', 'rolling_mean_6',
+    'trend', 'month_sin', 'month_cos', 'is_summer', 'is_winter',
+    'lat_norm', 'lon_norm', 'female_ratio', 'avg_victim_age',
+]
+
+
+def monthly_frame(n_locations=12, seed=0):
+    """Monthly aggregations for 2020-2024 with a time trend, shaped like CrimeSafeTrainer.load_data.
+
+    Half the locations only report from 2022, so the trend index and the lat/lon
+    normalisation depend on which years are loaded.
+    """
+    rng = np.random.default_rng(seed)
+    months = pd.MultiIndex.from_product([range(n_locations), range(2020, 2025), range(1, 13)],
+                                        names=['location', 'year', 'month']).to_frame(index=False)
+    months = months[(months['location'] < n_locations // 2) | (months['year'] >= 2022)].reset_index(drop=True)
+    location = months['location'].to_numpy()
+    elapsed = (months['year'] - 2020) * 12 + months['month']
+    return pd.DataFrame({
+        'location_id': [f"loc_{i:02d}" for i in location],
+        'year': months['year'],
+        'month': months['month'],
+        'crime_count': rng.poisson(20 + 5 * location + elapsed),
+        'male_victims': rng.poisson(10, len(months)),
+        'female_victims': rng.poisson(8, len(months)),
+        'avg_victim_age': rng.uniform(20, 50, len(months)),
+        'latitude': rng.uniform(8, 30, n_locations)[location],
+        'longitude': rng.uniform(70, 90, n_locations)[location],
+    })
+
+
+@pytest.fixture
+def trained(tmp_path, monkeypatch):
+    """A time-series artifact fit like train_xgboost_model's, plus its saved feature rows.
+
+    A linear model weighs every feature, so any difference in trend or lat/lon
+    normalisation shows up in its prediction.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('DATABASE_URL', 'postgresql://localhost/crimesafe')
+    import train
+    monkeypatch.setattr(train, 'MODEL_DIR', tmp_path)
+    frame = monthly_frame()
+
+    trainer = train.CrimeSafeTrainer()
+    train_df = trainer.engineer_features(frame[frame['year'].isin(train.TRAIN_YEARS)])
+    train_clean = train_df.dropna(subset=FEATURE_COLS + ['crime_count'])
+    scaler = StandardScaler()
+    model = LinearRegression()
+    model.fit(scaler.fit_transform(train_clean[FEATURE_COLS]), train_clean['crime_count'])
+    artifact = {'model': model, 'scaler': scaler, 'feature_cols': FEATURE_COLS}
+    joblib.dump(artifact, tmp_path / f"xgboost_{train.MODEL_VERSION}.joblib")
+    trainer.feature_names = FEATURE_COLS
+    trainer.save_feature_rows([train_df])
+    return artifact, train_clean
+
+
+def expected_prediction(artifact, train_clean, location_id, year, month):
+    row = train_clean[(train_clean['location_id'] == location_id) & (train_clean['year'] == year)
+                      & (train_clean['month'] == month)]
+    return float(artifact['model'].predict(artifact['scaler'].transform(row[FEATURE_COLS]))[0])
+
+
+def test_explanation_matches_training_prediction(trained, tmp_path):
+    from explanations import TimeSeriesExplainer, latest_time_series_artifact
+    artifact, train_clean = trained
+    expected = expected_prediction(artifact, train_clean, 'loc_03', 2022, 6)
+    explainer = TimeSeriesExplainer(latest_time_series_artifact(str(tmp_path)))
+
+    result = explainer.explain('loc_03', 2022, 6)
+
+    assert result['prediction'] == pytest.approx(expected, abs=1e-6)
+    assert result['base_value'] + sum(result['contributions'].values()) == pytest.approx(expected, abs=1e-6)
+    assert explainer.explain('loc_03', 2022, 6) == result
+    assert explainer.service.hits == 1
+    with pytest.raises(ValueError):
+        explainer.explain('loc_03', 2030, 6)
+
+
+def test_explain_location_route(trained, tmp_path, monkeypatch):
+    import app as app_module
+    artifact, train_clean = trained
+    monkeypatch.setattr(app_module, 'time_series_explanations', app_module.TimeSeriesExplanations(str(tmp_path)))
+    client = app_module.app.test_client()
+
+    response = client.post('/explain/location', json={'location_id': 'loc_03', 'year': 2022, 'month': 6})
+    assert response.status_code == 200
+    assert response.get_json()['prediction'] == pytest.approx(
+        expected_prediction(artifact, train_clean, 'loc_03', 2022, 6), abs=1e-6)
+    assert client.post('/explain/location', json={'location_id': 'loc_99', 'year': 2022, 'month': 6}).status_code == 404
+    assert client.post('/explain/location', json={'location_id': 'loc_03', 'year': 2022}).status_code == 400
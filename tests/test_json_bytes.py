@@ -0,0 +1,21 @@
+import json
+
+import pytest
+
+import app
+
+PAYLOAD = {'city': 'Thiruvananthapuram – Kerala', 'shap': [1e-05, 1e-07, -0.5, 123456.789], 'b': None}
+
+
+@pytest.mark.parametrize('indent', [False, True])
+def test_json_bytes_parses_like_stdlib(indent):
+    stdlib = json.dumps(PAYLOAD, default=app.DefaultJSONProvider.default, sort_keys=True)
+
+    assert json.loads(app.json_bytes(PAYLOAD, indent=indent)) == json.loads(stdlib)
+
+
+def test_orjson_bytes_are_not_stdlib_bytes():
+    pytest.importorskip('orjson')
+    body = app.json_bytes({'city': 'Kochi – Kerala', 'shap': [1e-05, 1e-07]})
+
+    assert body == '{"city":"Kochi – Kerala","shap":[0.00001,1e-7]}'.encode()
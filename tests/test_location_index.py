@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from scripts.safety_model import EARTH_RADIUS_KM, LocationIndex
+
+
+def brute_force(latitudes, longitudes, lat, lon, radius_km):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat, lon, latitudes, longitudes))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    return {i: d for i, d in enumerate(distances) if d <= radius_km}
+
+
+def random_locations(n, seed=0):
+    """Points uniform on the sphere, plus a band straddling the antimeridian"""
+    rng = np.random.default_rng(seed)
+    latitudes = np.concatenate([np.degrees(np.arcsin(rng.uniform(-1, 1, n))), rng.uniform(-60, 60, n // 4)])
+    longitudes = np.concatenate([rng.uniform(-180, 180, n), rng.choice([-1, 1], n // 4) * rng.uniform(179, 180, n // 4)])
+    return latitudes, longitudes
+
+
+@pytest.fixture(scope='module')
+def index():
+    latitudes, longitudes = random_locations(4000)
+    ids = [f"loc_{i}" for i in range(len(latitudes))]
+    locations = {'location_id': ids, 'location_name': ids, 'city': ['X'] * len(ids),
+                 'latitude': latitudes, 'longitude': longitudes}
+    return LocationIndex(locations), latitudes, longitudes
+
+
+@pytest.mark.parametrize('lat, lon, radius_km', [
+    (20.0, 78.0, 300), (20.0, 78.0, 500), (0.0, 179.9, 300), (0.0, -179.9, 300), (45.0, 180.0, 1000),
+    (-35.0, -179.99, 150), (85.0, 10.0, 400), (-89.0, 0.0, 400), (60.0, 179.5, 2500), (10.0, 0.0, 8000),
+])
+def test_query_matches_brute_force(index, lat, lon, radius_km):
+    index, latitudes, longitudes = index
+    expected = brute_force(latitudes, longitudes, lat, lon, radius_km)
+
+    found, distances = index.query(lat, lon, radius_km)
+
+    ids = [int(index.location_ids[i][len('loc_'):]) for i in found]
+    assert expected
+    assert sorted(ids) == sorted(expected)
+    assert np.allclose(distances, [expected[i] for i in ids])
+    if abs(lon) > 179:
+        # the circle crosses the antimeridian and finds points on both sides of it
+        assert longitudes[ids].min() < 0 < longitudes[ids].max()
@@ -0,0 +1,95 @@
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+import pytest
+import xgboost as xgb
+
+import app
+from scripts.safety_model import BUNDLE_MANIFEST, save_bundle
+
+PICKLE = os.path.join(app.BASE_DIR, 'crime_safety_model_deployment.pkl')
+
+
+def write_bundle(models_dir, name, version):
+    """Small XGBoost bundle over the shipped pickle's cities and encoders"""
+    artifacts = joblib.load(PICKLE)
+    features = np.random.default_rng(0).random((64, len(artifacts['feature_columns'])))
+    model = xgb.XGBRegressor(n_estimators=5, max_depth=2)
+    model.fit(features, features.sum(axis=1))
+    return save_bundle(os.path.join(models_dir, name), {**artifacts, 'model': model}, version)
+
+
+@pytest.fixture
+def registry(tmp_path):
+    models_dir = tmp_path / 'models'
+    models_dir.mkdir()
+    write_bundle(models_dir, 'city_safety_v1_20260101_000000', 'v1_20260101_000000')
+    registry = app.ModelRegistry(str(models_dir), [PICKLE])
+    assert registry.start()
+    assert registry.active.version == 'v1_20260101_000000'
+    return registry
+
+
+def test_reload_keeps_active_model_when_newest_bundle_is_broken(registry):
+    bundle_dir = write_bundle(registry.models_dir, 'city_safety_v1_20260102_000000', 'v1_20260102_000000')
+    manifest_path = os.path.join(bundle_dir, BUNDLE_MANIFEST)
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest['format_version'] = 99
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f)
+
+    registry._reload()
+
+    assert registry.active.version == 'v1_20260101_000000'
+    assert registry.last_error.startswith(manifest_path)
+
+
+def test_reload_swaps_to_newer_bundle(registry):
+    write_bundle(registry.models_dir, 'city_safety_v1_20260102_000000', 'v1_20260102_000000')
+
+    registry._reload()
+
+    assert registry.active.version == 'v1_20260102_000000'
+
+
+def test_cold_start_falls_back_to_older_candidates(tmp_path):
+    bundle_dir = tmp_path / 'city_safety_v1_20260101_000000'
+    bundle_dir.mkdir()
+    (bundle_dir / BUNDLE_MANIFEST).write_text('{}')
+    registry = app.ModelRegistry(str(tmp_path), [PICKLE])
+
+    assert registry.start()
+    assert registry.active.path == PICKLE
+
+
+def test_partial_bundle_is_ignored(registry):
+    partial = os.path.join(registry.models_dir, 'city_safety_v1_20260102_000000.tmp')
+    write_bundle(registry.models_dir, 'city_safety_v1_20260102_000000.tmp', 'v1_20260102_000000')
+    assert os.path.isdir(partial)
+
+    listing = registry.scan()[0]
+    assert all(not name.endswith('.tmp') for name, _ in listing)
+    assert app.find_latest_bundle(registry.models_dir).endswith('city_safety_v1_20260101_000000')
+
+
+def test_bundle_written_during_reload_is_loaded(registry):
+    load = registry.load
+
+    def slow_load():
+        # the new bundle lands after this load picked its candidates
+        registry.load = load
+        write_bundle(registry.models_dir, 'city_safety_v1_20260102_000000', 'v1_20260102_000000')
+        return None
+
+    registry.load = slow_load
+    registry.loading = True
+    registry._reload()
+
+    deadline = time.monotonic() + 30
+    while registry.active.version != 'v1_20260102_000000' and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert registry.active.version == 'v1_20260102_000000'
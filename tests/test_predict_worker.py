@@ -0,0 +1,30 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def worker_responses(*requests):
+    """Run predict_safety.py --worker from the repo root (shipped pickle, no models/) over requests"""
+    stdin = ''.join(json.dumps(request) + '\n' for request in requests)
+    result = subprocess.run(
+        [sys.executable, '-W', 'ignore', os.path.join('scripts', 'predict_safety.py'), '--worker'],
+        input=stdin, capture_output=True, text=True, cwd=ROOT, timeout=120, check=True,
+    )
+    lines = [json.loads(line) for line in result.stdout.splitlines()]
+    assert lines[0]['ready']
+    return lines[1:]
+
+
+def test_radius_request_without_locations_falls_back_to_cities():
+    profile = {'age': 30, 'gender': 'F', 'year': 2024}
+    radius, cities = worker_responses(
+        {'id': 1, **profile, 'lat': 19.0, 'lon': 72.8, 'radius_km': 25, 'top_n': 3},
+        {'id': 2, **profile, 'top_k': 3},
+    )
+
+    assert radius['success'] and radius['radius_applied'] is False
+    assert radius['predictions'] == cities['predictions']
+    assert len(radius['predictions']) == 3
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from scripts.safety_model import ranked_order, top_k
+
+
+def tied_scores(n, seed=0):
+    """Rounded scores with many exact ties, as round_scores produces"""
+    return np.round(np.random.default_rng(seed).integers(0, 8, n) * 12.5, 2)
+
+
+@pytest.mark.parametrize('k', [0, 1, 2, 7, 8, 9, 49, 50, 60])
+def test_top_k_matches_ranked_order_slice(k):
+    scores = tied_scores(50)
+
+    assert top_k(scores, k).tolist() == ranked_order(scores)[:k].tolist()
+
+
+@pytest.mark.parametrize('k', [1, 5, 20])
+def test_bottom_k_matches_reversed_ranked_order(k):
+    scores = tied_scores(50, seed=1)
+
+    assert top_k(-scores, k, -np.arange(len(scores))).tolist() == ranked_order(scores)[::-1][:k].tolist()
+
+
+def test_top_k_orders_ties_by_tiebreak():
+    scores = tied_scores(50, seed=2)
+    tiebreak = np.random.default_rng(3).permutation(len(scores))
+
+    for k in (1, 6, 25, 50):
+        assert top_k(scores, k, tiebreak).tolist() == np.lexsort((tiebreak, -scores))[:k].tolist()
+
+
+def test_top_k_all_equal():
+    assert top_k(np.full(10, 42.0), 3).tolist() == [0, 1, 2]
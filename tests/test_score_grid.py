@@ -0,0 +1,115 @@
+import multiprocessing
+import os
+import time
+from types import SimpleNamespace
+
+import joblib
+import numpy as np
+import pytest
+
+import app
+from scripts.safety_model import CityFeatureTable, ScoreGrid
+
+PICKLE = os.path.join(app.BASE_DIR, 'crime_safety_model_deployment.pkl')
+fork = pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+
+
+def shipped_table():
+    artifacts = joblib.load(PICKLE)
+    table = CityFeatureTable(artifacts['label_encoders'], artifacts['feature_columns'], artifacts['all_cities'],
+                             artifacts.get('city_stats'))
+    return table, artifacts['model']
+
+
+class CountingModel:
+    """Wraps a model, appending this process' pid to a file on every predict call"""
+
+    def __init__(self, model, log_path, delay=0.0):
+        self.model = model
+        self.log_path = log_path
+        self.delay = delay
+
+    def predict(self, features):
+        with open(self.log_path, 'a') as f:
+            f.write(f"{os.getpid()}\n")
+        time.sleep(self.delay)
+        return self.model.predict(features)
+
+
+def build_shared(table, model, directory, results):
+    grid = ScoreGrid.shared(table, model, directory)
+    results.put(grid.lookup(30, 'F', 2024))
+
+
+@fork
+def test_shared_grid_is_scored_by_one_process(tmp_path):
+    table, model = shipped_table()
+    log_path = tmp_path / 'predict.log'
+    counting = CountingModel(model, log_path, delay=0.01)
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    workers = [context.Process(target=build_shared, args=(table, counting, str(tmp_path), results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    lookups = [results.get(timeout=60) for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    assert len(set(log_path.read_text().split())) == 1
+    assert all(lookup == lookups[0] for lookup in lookups)
+    assert lookups[0] == ScoreGrid(table, model).lookup(30, 'F', 2024)
+
+
+def child_lookup(cache, results):
+    # Forked while the parent's build thread was still running: the thread is gone here
+    assert cache.grid is None
+    cache.get('v1', 30, 'F', 2024)
+    deadline = time.monotonic() + 60
+    while cache.grid is None and time.monotonic() < deadline:
+        time.sleep(0.05)
+    results.put((cache.build_pid == os.getpid(), cache.get('v1', 30, 'F', 2024)))
+
+
+@fork
+def test_forked_worker_builds_its_own_grid(tmp_path):
+    table, model = shipped_table()
+    loaded = SimpleNamespace(version='v1', feature_table=table, fingerprint=('v1',),
+                             model=CountingModel(model, tmp_path / 'predict.log', delay=0.05))
+    cache = app.PredictionCache('grid', 16)
+    cache.reset(loaded)
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    child = context.Process(target=child_lookup, args=(cache, results))
+    child.start()
+    built_here, cached = results.get(timeout=60)
+    child.join()
+
+    assert built_here
+    assert cached == ScoreGrid(table, model).lookup(30, 'F', 2024)
+
+
+@pytest.fixture(scope='module')
+def grid():
+    table, model = shipped_table()
+    return ScoreGrid(table, model), SimpleNamespace(feature_table=table, model=model)
+
+
+@pytest.mark.parametrize('age', [0, 17, 18, 30, 45, 60, 100])
+@pytest.mark.parametrize('gender', ['M', 'F'])
+@pytest.mark.parametrize('year', [2020, 2024, 2030])
+def test_grid_lookup_matches_direct_scoring(grid, age, gender, year):
+    grid, current = grid
+    cities, scores = app.score_cities(current, age, gender, year)
+    ranked = sorted(zip(cities, scores), key=lambda pair: pair[1], reverse=True)
+
+    assert grid.lookup(age, gender, year) == ([city for city, _ in ranked], [score for _, score in ranked])
+    assert grid.lookup(float(age), gender, year) == grid.lookup(age, gender, year)
+
+
+@pytest.mark.parametrize('age, gender, year', [
+    (101, 'F', 2024), (-1, 'F', 2024), (30, 'F', 2019), (30, 'F', 2031),
+    (30, 'X', 2024), (30.5, 'F', 2024), (30, 'F', 2024.5), (True, 'F', 2024),
+])
+def test_grid_lookup_outside_grid_is_none(grid, age, gender, year):
+    grid, _ = grid
+    assert grid.lookup(age, gender, year) is None
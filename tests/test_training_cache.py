@@ -0,0 +1,40 @@
+import json
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+from training_cache import LEGACY_MANIFEST_NAME, TrainingDataCache
+
+
+def test_branches_keep_each_others_watermarks(tmp_path):
+    # The time-series and safety branches each open the cache in their own process
+    time_series = TrainingDataCache(tmp_path)
+    safety = TrainingDataCache(tmp_path)
+    csv_path = tmp_path / 'crime_dataset_india.csv'
+    csv_path.write_text('City\nDelhi\n')
+
+    frame = pd.DataFrame({'location_id': ['a'], 'year': [2023], 'month': [1], 'crime_count': [3]})
+    time_series.write_partition('2023-01', frame, '2023-01-31T00:00:00')
+    time_series.manifest['location_stats'] = 'ls-1'
+    time_series.save_manifest('monthly')
+    safety.write_raw_csv(csv_path, pd.DataFrame({'City': ['Delhi']}))
+
+    reopened = TrainingDataCache(tmp_path)
+    assert reopened.manifest['monthly'] == {'2023-01': '2023-01-31T00:00:00'}
+    assert reopened.manifest['location_stats'] == 'ls-1'
+    assert reopened.manifest['raw_csv'] == TrainingDataCache.file_mark(csv_path)
+    assert reopened.stale_partitions({'2023-01': '2023-01-31T00:00:00'}, 'ls-1') == []
+    assert reopened.read_raw_csv(csv_path) is not None
+
+
+def test_legacy_manifest_is_still_read(tmp_path):
+    legacy = {'monthly': {'2023-01': 'w1'}, 'location_stats': 'ls-1', 'raw_csv': {'path': 'x'}}
+    (tmp_path / LEGACY_MANIFEST_NAME).write_text(json.dumps(legacy))
+
+    assert TrainingDataCache(tmp_path).manifest == legacy
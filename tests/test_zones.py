@@ -0,0 +1,58 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+pytest.importorskip('psycopg2')  # scripts/train.py connects to the database with it
+from sklearn.metrics import confusion_matrix
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+
+@pytest.fixture
+def train(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('DATABASE_URL', 'postgresql://localhost/crimesafe')
+    import train
+    return train
+
+
+def loop_zone(count, amber_threshold, red_threshold):
+    """The per-row if/elif evaluate_classification used before zone_codes"""
+    if count > red_threshold:
+        return 'red'
+    elif count > amber_threshold:
+        return 'amber'
+    else:
+        return 'green'
+
+
+@pytest.mark.parametrize('amber_threshold, red_threshold', [(20, 50), (20.5, 49.5)])
+def test_zone_codes_match_loop_at_boundaries(train, amber_threshold, red_threshold):
+    counts = np.array([-1, 0, 19, 20, 20.5, 21, 49.5, 50, 51, 1e9, 7.25], dtype=np.float64)
+    counts = np.concatenate([counts, np.nextafter([amber_threshold, red_threshold], np.inf),
+                             np.nextafter([amber_threshold, red_threshold], -np.inf)])
+
+    codes = train.zone_codes(counts, amber_threshold, red_threshold)
+
+    assert [train.ZONE_LABELS[code] for code in codes] == [
+        loop_zone(count, amber_threshold, red_threshold) for count in counts]
+
+
+def test_zone_confusion_matrix_matches_sklearn(train):
+    rng = np.random.default_rng(0)
+    actual = rng.integers(0, 80, 500).astype(np.float64)
+    predicted = np.concatenate([[train.AMBER_THRESHOLD, train.RED_THRESHOLD] * 2, rng.uniform(0, 80, 496)])
+    actual[:4] = [train.AMBER_THRESHOLD, train.RED_THRESHOLD, train.AMBER_THRESHOLD + 1, train.RED_THRESHOLD + 1]
+
+    matrix = train.zone_confusion_matrix(train.zone_codes(actual), train.zone_codes(predicted))
+
+    expected = confusion_matrix([loop_zone(count, train.AMBER_THRESHOLD, train.RED_THRESHOLD) for count in actual],
+                                [loop_zone(count, train.AMBER_THRESHOLD, train.RED_THRESHOLD) for count in predicted], labels=train.ZONE_LABELS)
+    assert matrix.tolist() == expected.tolist()
+
+
+def test_zone_codes_reject_nan(train):
+    with pytest.raises(ValueError):
+        train.zone_codes([1.0, np.nan])